@@ -0,0 +1,208 @@
+"""
+Query backends for BigQueryAnalytics.
+Each backend runs the analytics queries in its own SQL dialect: BigQuery
+in the cloud, or a local SQLite database (e.g. databases/insider_risk.db)
+for offline benchmarking and small deployments.
+
+pandas, google-cloud-bigquery and the SQLite reader (which pulls in
+Apache Beam) are imported on first use, so importing this module and
+building queries stay cheap.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from google.cloud import bigquery
+
+# Query parameters as {name: (BigQuery type, value)}, e.g.
+# {'days': ('INT64', 30)}; local backends ignore the type
+QueryParams = Dict[str, Tuple[str, Any]]
+
+# Rows per record batch for local bulk reads
+DEFAULT_BATCH_ROWS = 65_536
+
+
+class BigQueryBackend:
+    """
+    Run queries on BigQuery in GoogleSQL. The client is created on the
+    first query; with project_id=None, the project (and so any table
+    reference) comes from the default credentials at that point.
+    """
+
+    def __init__(self, project_id: Optional[str], dataset_id: str) -> None:
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self._client: Any = None
+        self._bqstorage_client: Any = None
+        # Guards lazy client creation across concurrent queries
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> bigquery.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google.cloud import bigquery
+
+                    self._client = bigquery.Client(project=self.project_id)
+        return self._client
+
+    def table(self, name: str) -> str:
+        """Fully qualified, backticked table reference."""
+        project = self.project_id or self.client.project
+        return f"`{project}.{self.dataset_id}.{name}`"
+
+    def param(self, name: str) -> str:
+        return f'@{name}'
+
+    def days_ago(self, days_param: str) -> str:
+        """Timestamp expression for now minus a days parameter."""
+        return (
+            'TIMESTAMP_SUB(CURRENT_TIMESTAMP(), '
+            f'INTERVAL {self.param(days_param)} DAY)'
+        )
+
+    def countif(self, condition: str) -> str:
+        return f'COUNTIF({condition})'
+
+    def hour(self, column: str) -> str:
+        return f'EXTRACT(HOUR FROM {column})'
+
+    def _job_config(self, params: QueryParams) -> bigquery.QueryJobConfig:
+        from google.cloud import bigquery
+
+        return bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter(name, type_, value)
+            for name, (type_, value) in params.items()
+        ])
+
+    def _storage_client(self) -> Any:
+        """Shared Storage Read API client, or None if not installed."""
+        if self._bqstorage_client is None:
+            try:
+                from google.cloud import bigquery_storage
+            except ImportError:
+                return None  # Results are paged through the REST API
+            with self._lock:
+                if self._bqstorage_client is None:
+                    self._bqstorage_client = (
+                        bigquery_storage.BigQueryReadClient()
+                    )
+        return self._bqstorage_client
+
+    def run(self, query: str, params: QueryParams) -> pd.DataFrame:
+        return self.client.query(
+            query, job_config=self._job_config(params)
+        ).to_dataframe(bqstorage_client=self._storage_client())
+
+    def explain(self, query: str, params: QueryParams) -> pd.DataFrame:
+        """Bytes the query would scan, from a free dry run."""
+        import pandas as pd
+
+        job_config = self._job_config(params)
+        job_config.dry_run = True
+        job_config.use_query_cache = False
+        job = self.client.query(query, job_config=job_config)
+        return pd.DataFrame(
+            {'total_bytes_processed': [job.total_bytes_processed]}
+        )
+
+    def iter_record_batches(
+        self, query: str, params: QueryParams
+    ) -> Iterator[Any]:
+        """Stream results as pyarrow RecordBatches (Storage Read API)."""
+        rows = self.client.query(
+            query, job_config=self._job_config(params)
+        ).result()
+        yield from rows.to_arrow_iterable(
+            bqstorage_client=self._storage_client()
+        )
+
+
+class SQLiteBackend:
+    """
+    Run the same queries on a local SQLite copy of risk_events, with
+    SQLite equivalents of TIMESTAMP_SUB, COUNTIF and EXTRACT(HOUR).
+    Each thread gets its own read-only connection, memory-mapping
+    mmap_size bytes (None = sqlite_source.DEFAULT_MMAP_SIZE).
+    """
+
+    def __init__(
+        self, db_path: str, mmap_size: Optional[int] = None
+    ) -> None:
+        self.db_path = db_path
+        self._mmap_size = mmap_size
+        self._local = threading.local()
+
+    def _connection(self) -> Any:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            from sqlite_source import DEFAULT_MMAP_SIZE, connect_read_only
+
+            conn = connect_read_only(
+                self.db_path,
+                DEFAULT_MMAP_SIZE if self._mmap_size is None
+                else self._mmap_size,
+            )
+            self._local.conn = conn
+        return conn
+
+    def table(self, name: str) -> str:
+        return name
+
+    def param(self, name: str) -> str:
+        return f':{name}'
+
+    def days_ago(self, days_param: str) -> str:
+        # Same 'YYYY-MM-DD HH:MM:SS' text form as the stored timestamps
+        return f"datetime('now', '-' || {self.param(days_param)} || ' days')"
+
+    def countif(self, condition: str) -> str:
+        return f'SUM(CASE WHEN {condition} THEN 1 ELSE 0 END)'
+
+    def hour(self, column: str) -> str:
+        return f"CAST(strftime('%H', {column}) AS INTEGER)"
+
+    def run(self, query: str, params: QueryParams) -> pd.DataFrame:
+        import pandas as pd
+
+        return pd.read_sql_query(
+            query, self._connection(), params=_values(params)
+        )
+
+    def explain(self, query: str, params: QueryParams) -> pd.DataFrame:
+        """
+        EXPLAIN QUERY PLAN rows; time-filtered queries show a SEARCH on
+        idx_timestamp instead of a full SCAN of risk_events.
+        """
+        import pandas as pd
+
+        return pd.read_sql_query(
+            f'EXPLAIN QUERY PLAN {query}', self._connection(),
+            params=_values(params),
+        )
+
+    def iter_record_batches(
+        self,
+        query: str,
+        params: QueryParams,
+        batch_rows: int = DEFAULT_BATCH_ROWS
+    ) -> Iterator[Any]:
+        """Stream results as pyarrow RecordBatches of batch_rows rows."""
+        import pandas as pd
+        import pyarrow as pa
+
+        for chunk in pd.read_sql_query(
+            query, self._connection(), params=_values(params),
+            chunksize=batch_rows,
+        ):
+            yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+
+
+def _values(params: Optional[QueryParams]) -> Dict[str, Any]:
+    """Strip BigQuery types from query parameters."""
+    return {name: value for name, (_, value) in (params or {}).items()}
@@ -0,0 +1,327 @@
+"""
+Compact, array-backed store of per-user anomaly detection baselines.
+Baselines are parallel arrays that can be saved with np.save and
+memory-mapped read-only by every worker without unpickling.
+"""
+
+from __future__ import annotations
+
+import io
+from itertools import repeat
+from pathlib import Path
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+import numpy as np
+
+# Serving columns (float32) read by predict_anomaly/predict_batch
+STAT_FIELDS: Tuple[str, ...] = (
+    'mean_access',
+    'std_access',
+    'mean_transfer',
+    'std_transfer',
+)
+
+# Welford training state (float64): weighted count, running mean and sum of
+# squared deviations (M2) per feature. Serving stats are derived from these.
+STATE_FIELDS: Tuple[str, ...] = (
+    'count',
+    'running_mean_access',
+    'm2_access',
+    'running_mean_transfer',
+    'm2_transfer',
+)
+
+# Every array of the store, in on-disk order
+ARRAY_FIELDS: Tuple[str, ...] = (
+    ('user_ids',) + STAT_FIELDS + ('hour_mask',) + STATE_FIELDS
+)
+
+# Positional arguments of BaselineStore.from_moments
+_MOMENT_FIELDS: Tuple[str, ...] = (
+    'user_ids',
+    'count',
+    'running_mean_access',
+    'm2_access',
+    'running_mean_transfer',
+    'm2_transfer',
+    'hour_mask',
+)
+
+HOURS_PER_DAY = 24
+
+
+def _whole_hours(hours: np.ndarray) -> np.ndarray:
+    """True where an hour is a whole number in 0-23."""
+    return (hours >= 0) & (hours < HOURS_PER_DAY) & (hours == np.floor(hours))
+
+
+def hour_masks(
+    rows: np.ndarray, hours: np.ndarray, num_rows: int
+) -> np.ndarray:
+    """
+    OR together a 24-bit hour-of-day mask per row. Hours that are not
+    whole numbers in 0-23 cannot be represented and are ignored.
+    """
+    hours = np.asarray(hours)
+    valid = _whole_hours(hours)
+    seen = np.zeros((num_rows, HOURS_PER_DAY), dtype=bool)
+    seen[rows[valid], hours[valid].astype(np.int64)] = True
+    bits = np.left_shift(
+        np.uint32(1), np.arange(HOURS_PER_DAY, dtype=np.uint32)
+    )
+    return (seen * bits).sum(axis=1, dtype=np.uint32)
+
+
+def hour_bit(hour: Any) -> int:
+    """hour_bits for a single hour, with plain int operations."""
+    try:
+        whole = int(hour)
+    except (TypeError, ValueError):
+        return 0
+    if whole != hour or not 0 <= whole < HOURS_PER_DAY:
+        return 0
+    return 1 << whole
+
+
+def hour_bits(hours: np.ndarray) -> np.ndarray:
+    """Bit for each hour in a 24-bit mask; 0 for unrepresentable hours."""
+    hours = np.asarray(hours)
+    valid = _whole_hours(hours)
+    shifts = np.where(valid, hours, 0).astype(np.uint32)
+    return np.where(valid, np.left_shift(np.uint32(1), shifts), np.uint32(0))
+
+
+def _is_url(path: str | Path) -> bool:
+    """True for scheme://... paths, which are opened through Beam."""
+    return not isinstance(path, Path) and '://' in path
+
+
+class BaselineStore(Mapping[str, Dict[str, Any]]):
+    """
+    Per-user baselines as parallel arrays sorted by user_id:
+    float32 mean/std of file_access_count and data_transfer_size_mb, a
+    uint32 mask of normal hours (bit h set = hour h seen) and the float64
+    Welford state (count, running mean, M2) they are derived from.
+
+    Lookups map user ids to rows through a {user_id: row} dict built on
+    first use, then index the arrays directly. Mapping access returns
+    the legacy per-user dict for inspection.
+    """
+
+    user_ids: np.ndarray
+    mean_access: np.ndarray
+    std_access: np.ndarray
+    mean_transfer: np.ndarray
+    std_transfer: np.ndarray
+    hour_mask: np.ndarray
+    count: np.ndarray
+    running_mean_access: np.ndarray
+    m2_access: np.ndarray
+    running_mean_transfer: np.ndarray
+    m2_transfer: np.ndarray
+
+    def __init__(self, **arrays: np.ndarray) -> None:
+        missing = set(ARRAY_FIELDS) - arrays.keys()
+        if missing:
+            raise ValueError(f"Missing baseline arrays: {sorted(missing)}")
+        for name in ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+        self._row_index: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def empty(cls) -> BaselineStore:
+        """A store with no users."""
+        return cls.from_moments(
+            np.empty(0, dtype=str), *(np.empty(0),) * 5,
+            np.empty(0, dtype=np.uint32),
+        )
+
+    @classmethod
+    def from_moments(
+        cls,
+        user_ids: np.ndarray,
+        count: np.ndarray,
+        mean_access: np.ndarray,
+        m2_access: np.ndarray,
+        mean_transfer: np.ndarray,
+        m2_transfer: np.ndarray,
+        hour_mask: np.ndarray
+    ) -> BaselineStore:
+        """
+        Build a store from unsorted, unique user rows of Welford moments.
+        std is the population std sqrt(M2 / count), as np.std.
+        """
+        user_ids = np.asarray(user_ids).astype(str)
+        order = np.argsort(user_ids, kind='stable')
+        count = np.asarray(count, dtype=np.float64)[order]
+        state = {
+            'count': count,
+            'running_mean_access':
+                np.asarray(mean_access, dtype=np.float64)[order],
+            'm2_access': np.asarray(m2_access, dtype=np.float64)[order],
+            'running_mean_transfer':
+                np.asarray(mean_transfer, dtype=np.float64)[order],
+            'm2_transfer': np.asarray(m2_transfer, dtype=np.float64)[order],
+        }
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std_access = np.sqrt(state['m2_access'] / count)
+            std_transfer = np.sqrt(state['m2_transfer'] / count)
+        return cls(
+            user_ids=user_ids[order],
+            mean_access=state['running_mean_access'].astype(np.float32),
+            std_access=np.nan_to_num(std_access).astype(np.float32),
+            mean_transfer=state['running_mean_transfer'].astype(np.float32),
+            std_transfer=np.nan_to_num(std_transfer).astype(np.float32),
+            hour_mask=np.asarray(hour_mask, dtype=np.uint32)[order],
+            **state,
+        )
+
+    def _index(self) -> Dict[str, int]:
+        """The {user_id: row} dict, built on first use."""
+        index = self._row_index
+        if index is None:
+            index = self._row_index = {
+                user: row for row, user in enumerate(self.user_ids.tolist())
+            }
+        return index
+
+    def rows(self, user_ids: Any) -> np.ndarray:
+        """
+        int32 row index for each user id, -1 for users not in the store.
+        A dict lookup per id is cheaper than a binary search over the
+        fixed-width string array, up to about a million users.
+        """
+        keys = np.asarray(user_ids).tolist()
+        return np.fromiter(
+            map(self._index().get, map(str, keys), repeat(-1, len(keys))),
+            dtype=np.int32, count=len(keys),
+        )
+
+    def row(self, user_id: Any) -> int:
+        """Row index of one user, -1 if unknown."""
+        return self._index().get(str(user_id), -1)
+
+    def gather(self, name: str, rows: np.ndarray) -> np.ndarray:
+        """Values of one column for each row index; 0 where row is -1."""
+        values = getattr(self, name)
+        if len(values) == 0:
+            return np.zeros(len(rows), dtype=values.dtype)
+        return np.where(rows >= 0, values[np.maximum(rows, 0)], 0)
+
+    def merge(self, newer: BaselineStore) -> BaselineStore:
+        """Return a store with newer's users replacing this store's."""
+        if len(self) == 0:
+            return newer
+        keep = ~np.isin(self.user_ids, newer.user_ids)
+        return BaselineStore.from_moments(*(
+            np.concatenate([getattr(self, name)[keep], getattr(newer, name)])
+            for name in _MOMENT_FIELDS
+        ))
+
+    def combine(
+        self, batch: BaselineStore, decay: float = 1.0
+    ) -> BaselineStore:
+        """
+        Fold a batch's statistics into this store (Chan et al. parallel
+        Welford update). Before folding, every existing user's count and M2
+        are multiplied by decay, so old behaviour fades out while means are
+        kept; decay=1.0 gives the same result as training on all events at
+        once. Normal-hour masks are OR-ed and do not decay.
+        """
+        if not 0.0 < decay <= 1.0:
+            raise ValueError('decay must be in (0, 1]')
+
+        user_ids = np.union1d(self.user_ids, batch.user_ids)
+        old_rows = self.rows(user_ids)
+        new_rows = batch.rows(user_ids)
+
+        count_a = self.gather('count', old_rows) * decay
+        count_b = batch.gather('count', new_rows)
+        count = count_a + count_b
+        # Share of the combined weight contributed by the batch
+        weight_b = np.divide(
+            count_b, count, out=np.zeros_like(count), where=count > 0
+        )
+
+        moments = [user_ids, count]
+        for feature in ('access', 'transfer'):
+            mean_a = self.gather(f'running_mean_{feature}', old_rows)
+            mean_b = batch.gather(f'running_mean_{feature}', new_rows)
+            delta = mean_b - mean_a
+            m2 = (
+                self.gather(f'm2_{feature}', old_rows) * decay
+                + batch.gather(f'm2_{feature}', new_rows)
+                + delta * delta * count_a * weight_b
+            )
+            moments += [mean_a + delta * weight_b, m2]
+
+        hour_mask = (
+            self.gather('hour_mask', old_rows)
+            | batch.gather('hour_mask', new_rows)
+        )
+        return BaselineStore.from_moments(*moments, hour_mask)
+
+    def save(self, path: str | Path) -> None:
+        """
+        Write the store as one .npy file per array into directory path,
+        a local directory or a Beam filesystem URL such as gs://.
+        """
+        if _is_url(path):
+            from apache_beam.io.filesystems import FileSystems
+
+            for name in ARRAY_FIELDS:
+                file_path = FileSystems.join(str(path), f'{name}.npy')
+                with FileSystems.create(file_path) as f:
+                    np.save(f, getattr(self, name))
+            return
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ARRAY_FIELDS:
+            np.save(directory / f'{name}.npy', getattr(self, name))
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> BaselineStore:
+        """
+        Load a saved store. Local stores are memory-mapped read-only with
+        mmap; stores at a Beam filesystem URL (e.g. gs://, which workers
+        cannot mmap) are read into memory through FileSystems.
+        """
+        if _is_url(path):
+            from apache_beam.io.filesystems import FileSystems
+
+            arrays = {}
+            for name in ARRAY_FIELDS:
+                file_path = FileSystems.join(str(path), f'{name}.npy')
+                with FileSystems.open(file_path) as f:
+                    arrays[name] = np.load(io.BytesIO(f.read()))
+            return cls(**arrays)
+        directory = Path(path)
+        mmap_mode = 'r' if mmap else None
+        return cls(**{
+            name: np.load(directory / f'{name}.npy', mmap_mode=mmap_mode)
+            for name in ARRAY_FIELDS
+        })
+
+    def __getitem__(self, user_id: str) -> Dict[str, Any]:
+        row = self.row(user_id)
+        if row < 0:
+            raise KeyError(user_id)
+        mask = int(self.hour_mask[row])
+        return {
+            'mean_access_count': float(self.mean_access[row]),
+            'std_access_count': float(self.std_access[row]),
+            'mean_transfer_size': float(self.mean_transfer[row]),
+            'std_transfer_size': float(self.std_transfer[row]),
+            'normal_hours': {
+                h for h in range(HOURS_PER_DAY) if mask >> h & 1
+            },
+        }
+
+    def __contains__(self, user_id: object) -> bool:
+        return self.row(user_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.user_ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
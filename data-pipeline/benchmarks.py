@@ -0,0 +1,471 @@
+"""
+Benchmark suite for the data pipeline, detector and analytics hot paths.
+Runs the code directly (no runner) on fixed-seed synthetic events and
+can store results as JSON to compare events/sec and peak RSS between
+commits.
+"""
+
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import pyarrow as pa
+
+from analytics_backends import SQLiteBackend
+from bigquery_queries import BigQueryAnalytics
+from dataflow_pipeline import (
+    ProcessRiskEvents,
+    ProcessRiskEventsBatched,
+    RouteRiskEvents,
+    filter_access_events,
+    filter_auth_events,
+    filter_data_transfer_events,
+    filter_other_events,
+    filter_privileged_events,
+    filter_sensitive_data_events,
+)
+from event_decoding import (
+    DECODER_BACKENDS,
+    RISK_EVENT_FIELDS,
+    RISK_FLAG_FIELDS,
+    get_decoder,
+    resolve_backend,
+)
+from ml_anomaly_detection import (
+    SimpleAnomalyDetector,
+    enhance_event_with_ml,
+    enhance_events_with_ml,
+)
+from parquet_io import format_timestamps, record_batch_rows
+
+EVENT_TYPES = [
+    'DATA_ACCESS', 'FILE_DOWNLOAD', 'PRIVILEGED_ACTION',
+    'DATA_EXPORT', 'LOGIN', 'SENSITIVE_FILE_ACCESS', 'EMAIL_SEND',
+]
+
+# Dataset sizes selectable with --sizes
+SIZES: Dict[str, int] = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+FILTERS: List[Callable[[Dict[str, Any]], bool]] = [
+    filter_access_events,
+    filter_data_transfer_events,
+    filter_privileged_events,
+    filter_auth_events,
+    filter_sensitive_data_events,
+    filter_other_events,
+]
+
+
+def generate_event_lines(count: int, seed: int = 42) -> List[str]:
+    """Generate JSON lines shaped like exported SQLite risk_events rows."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        event: Dict[str, Any] = {
+            'id': i + 1,
+            'user_id': f'user{rng.randrange(1000):04d}',
+            'event_type': rng.choice(EVENT_TYPES),
+            'timestamp': f'2024-01-{rng.randint(1, 28):02d} '
+                         f'{rng.randrange(24):02d}:{rng.randrange(60):02d}:00',
+        }
+        for field in RISK_FLAG_FIELDS:
+            event[field] = int(rng.random() < 0.25)
+        lines.append(json.dumps(event))
+    return lines
+
+
+def generate_detector_events(
+    count: int, seed: int = 42
+) -> List[Dict[str, Any]]:
+    """Events with the anomaly detector's feature columns."""
+    rng = random.Random(seed)
+    return [
+        {
+            'user_id': f'user{rng.randrange(1000):04d}',
+            'file_access_count': rng.randrange(60),
+            'data_transfer_size_mb': round(rng.expovariate(0.05), 2),
+            'hour_of_day': rng.randrange(24),
+            'sensitive_data_access': rng.random() < 0.25,
+            'risk_score': float(rng.choice((0, 20, 30, 45, 70, 100))),
+        }
+        for _ in range(count)
+    ]
+
+
+def _measure(fn: Callable[[], int], repeat: int = 3) -> float:
+    """Run fn repeatedly and return the best events per second."""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        processed = fn()
+        best = max(best, processed / (time.perf_counter() - start))
+    return best
+
+
+def _repeats(count: int) -> int:
+    """Fewer repeats for large datasets to keep runs practical."""
+    return 3 if count <= 100_000 else 1
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def bench_decoders(count: int = 200_000) -> Dict[str, float]:
+    """Decode throughput of each installed JSON backend."""
+    lines = generate_event_lines(count)
+    results = {}
+    for backend in DECODER_BACKENDS:
+        if backend == 'auto':
+            continue
+        try:
+            decode = get_decoder(backend)
+        except ImportError:
+            continue
+        results[f'{backend}_events_per_sec'] = _measure(
+            lambda: sum(1 for line in lines if decode(line)),
+            _repeats(count),
+        )
+    return results
+
+
+def bench_process_risk_events(
+    count: int = 200_000, batch_size: int = 1024, decoder: str = 'auto'
+) -> Dict[str, float]:
+    """
+    ProcessRiskEvents on JSON lines, and per-element versus batched
+    scoring of the same events as Arrow record batches (Parquet input).
+    """
+    lines = generate_event_lines(count)
+
+    process = ProcessRiskEvents(decoder)
+    process.setup()
+
+    def run_per_element() -> int:
+        return sum(1 for line in lines for _ in process.process(line))
+
+    table = pa.Table.from_pylist([json.loads(line) for line in lines])
+    batches = [
+        table.slice(start, batch_size)
+        for start in range(0, count, batch_size)
+    ]
+
+    def run_parquet_per_element() -> int:
+        return sum(
+            1 for batch in batches for row in record_batch_rows(batch)
+            for _ in process.process(row)
+        )
+
+    batched = ProcessRiskEventsBatched(decoder)
+    batched.setup()
+
+    def run_parquet_batched() -> int:
+        return sum(
+            1 for batch in batches
+            for _ in batched.process(format_timestamps(batch))
+        )
+
+    return {
+        'per_element_events_per_sec': _measure(
+            run_per_element, _repeats(count)
+        ),
+        'parquet_per_element_events_per_sec': _measure(
+            run_parquet_per_element, _repeats(count)
+        ),
+        'parquet_batched_events_per_sec': _measure(
+            run_parquet_batched, _repeats(count)
+        ),
+    }
+
+
+def bench_routing(count: int = 200_000) -> Dict[str, float]:
+    """Each filter_* function alone, and single-pass RouteRiskEvents."""
+    processor = ProcessRiskEvents('json')
+    processor.setup()
+    events = [
+        out for line in generate_event_lines(count)
+        for out in processor.process(line)
+    ]
+
+    def apply(fn: Callable[[Dict[str, Any]], Any]) -> int:
+        for event in events:
+            fn(event)
+        return len(events)
+
+    results = {}
+    for filter_fn in FILTERS:
+        results[f'{filter_fn.__name__}_per_sec'] = _measure(
+            lambda: apply(filter_fn), _repeats(count)
+        )
+
+    router = RouteRiskEvents()
+    results['route_events_per_sec'] = _measure(
+        lambda: apply(lambda event: list(router.process(event))),
+        _repeats(count),
+    )
+    return results
+
+
+def bench_detector(count: int = 200_000) -> Dict[str, float]:
+    """SimpleAnomalyDetector training and per-event/batch prediction."""
+    events = generate_detector_events(count)
+    columns: Dict[str, List[Any]] = {
+        name: [event[name] for event in events] for name in events[0]
+    }
+
+    def train() -> int:
+        SimpleAnomalyDetector().train(events)
+        return count
+
+    def train_columnar() -> int:
+        SimpleAnomalyDetector().train_columnar(columns)
+        return count
+
+    detector = SimpleAnomalyDetector()
+    detector.train(events)
+
+    def predict_anomaly() -> int:
+        for event in events:
+            detector.predict_anomaly(event)
+        return count
+
+    def predict_batch() -> int:
+        detector.predict_batch(columns)
+        return count
+
+    repeat = _repeats(count)
+    return {
+        'train_events_per_sec': _measure(train, repeat),
+        'train_columnar_events_per_sec': _measure(train_columnar, repeat),
+        'predict_anomaly_events_per_sec': _measure(predict_anomaly, repeat),
+        'predict_batch_events_per_sec': _measure(predict_batch, repeat),
+    }
+
+
+def bench_enhance(
+    count: int = 200_000, batch_size: int = 1024
+) -> Dict[str, float]:
+    """enhance_event_with_ml per event versus enhance_events_with_ml."""
+    events = generate_detector_events(count)
+    detector = SimpleAnomalyDetector()
+    detector.train(events)
+
+    def per_event() -> int:
+        for event in events:
+            enhance_event_with_ml(event, detector)
+        return count
+
+    def batched() -> int:
+        for start in range(0, count, batch_size):
+            enhance_events_with_ml(
+                events[start:start + batch_size], detector
+            )
+        return count
+
+    repeat = _repeats(count)
+    return {
+        'enhance_event_events_per_sec': _measure(per_event, repeat),
+        'enhance_events_batched_events_per_sec': _measure(batched, repeat),
+    }
+
+
+def _build_sqlite_db(path: str, count: int) -> None:
+    """Load count synthetic events into a risk_events table at path."""
+    processor = ProcessRiskEvents('json')
+    processor.setup()
+    columns = RISK_EVENT_FIELDS[1:-1]  # id and created_at use defaults
+    conn = sqlite3.connect(path)
+    conn.execute(
+        'CREATE TABLE risk_events (id INTEGER PRIMARY KEY, '
+        'user_id TEXT, event_type TEXT, timestamp DATETIME, '
+        'risk_score REAL, risk_level TEXT, sensitive_data_access INTEGER, '
+        'unusual_time INTEGER, large_data_transfer INTEGER, '
+        'privileged_action INTEGER, created_at DATETIME)'
+    )
+    conn.executemany(
+        f"INSERT INTO risk_events ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})",
+        (
+            tuple(event[name] for name in columns)
+            for line in generate_event_lines(count)
+            for event in processor.process(line)
+        ),
+    )
+    for column in ('user_id', 'timestamp', 'risk_level'):
+        conn.execute(
+            f'CREATE INDEX idx_{column} ON risk_events({column})'
+        )
+    conn.commit()
+    conn.close()
+
+
+def bench_analytics(
+    count: int = 200_000, repeat: int = 20
+) -> Dict[str, float]:
+    """
+    BigQueryAnalytics queries on the local SQLite backend, uncached and
+    served from the result cache (queries per second).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'risk_events.db')
+        _build_sqlite_db(db_path, count)
+        backend = SQLiteBackend(db_path)
+        uncached = BigQueryAnalytics(backend=backend, cache_ttl_seconds=0)
+        cached = BigQueryAnalytics(backend=backend)
+
+        queries: Dict[str, Callable[[BigQueryAnalytics], Any]] = {
+            'risk_events': lambda a: a.get_risk_events(limit=100),
+            # Sample timestamps are in 2024, so use an all-time window
+            'risk_summary': lambda a: a.get_risk_summary(days=None),
+            'user_risk_profile': lambda a: a.get_user_risk_profile(
+                'user0001'
+            ),
+        }
+        results = {}
+        for name, query in queries.items():
+            for label, analytics in (
+                ('uncached', uncached), ('cached', cached)
+            ):
+                def run() -> int:
+                    for _ in range(repeat):
+                        query(analytics)
+                    return repeat
+
+                results[f'{name}_{label}_queries_per_sec'] = _measure(run)
+        return results
+
+
+BENCHMARKS: Dict[str, Callable[..., Dict[str, float]]] = {
+    'decoders': bench_decoders,
+    'process_risk_events': bench_process_risk_events,
+    'routing': bench_routing,
+    'detector': bench_detector,
+    'enhance': bench_enhance,
+    'analytics': bench_analytics,
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(
+    sizes: List[str],
+    benchmarks: List[str],
+    batch_size: int = 1024,
+    decoder: str = 'auto'
+) -> Dict[str, Any]:
+    """
+    Run the selected benchmarks at each size. Each result records
+    events (or queries) per second and the process peak RSS in MB after
+    it ran; peak RSS only grows, so run one benchmark per process for
+    isolated memory numbers.
+    """
+    results: Dict[str, Any] = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'decoder': resolve_backend(decoder),
+        'sizes': {},
+    }
+    for size in sizes:
+        count = SIZES[size]
+        size_results: Dict[str, Any] = {}
+        for name in benchmarks:
+            kwargs: Dict[str, Any] = {}
+            if name in ('process_risk_events', 'enhance'):
+                kwargs['batch_size'] = batch_size
+            if name == 'process_risk_events':
+                kwargs['decoder'] = decoder
+            metrics = BENCHMARKS[name](count, **kwargs)
+            metrics['peak_rss_mb'] = peak_rss_mb()
+            size_results[name] = metrics
+        results['sizes'][size] = size_results
+    return results
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any]
+) -> List[str]:
+    """Lines showing the relative change of every shared metric."""
+    lines = []
+    for size, benches in current['sizes'].items():
+        for bench, metrics in benches.items():
+            old = baseline.get('sizes', {}).get(size, {}).get(bench, {})
+            for metric, value in metrics.items():
+                if not old.get(metric) or value is None:
+                    continue
+                change = (value - old[metric]) / old[metric] * 100
+                lines.append(
+                    f"  {size} {bench}.{metric}: {old[metric]:,.0f} -> "
+                    f"{value:,.0f} ({change:+.1f}%)"
+                )
+    return lines
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--sizes', default='10k',
+        help=f"Comma-separated dataset sizes from {sorted(SIZES)}"
+    )
+    parser.add_argument(
+        '--benchmarks', default=','.join(BENCHMARKS),
+        help=f"Comma-separated subset of {list(BENCHMARKS)}"
+    )
+    parser.add_argument('--batch_size', type=int, default=1024)
+    parser.add_argument('--decoder', choices=DECODER_BACKENDS, default='auto')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument(
+        '--compare', help='Earlier results JSON to compare against'
+    )
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    benchmarks = args.benchmarks.split(',')
+    unknown = (
+        (set(sizes) - SIZES.keys()) | (set(benchmarks) - BENCHMARKS.keys())
+    )
+    if unknown:
+        parser.error(f"unknown sizes/benchmarks: {sorted(unknown)}")
+
+    results = run_suite(sizes, benchmarks, args.batch_size, args.decoder)
+    for size, benches in results['sizes'].items():
+        print(f"{size} events (decoder={results['decoder']}):")
+        for bench, metrics in benches.items():
+            print(f"  {bench}:")
+            for name, value in metrics.items():
+                print(f"    {name}: {value:,.0f}" if value is not None
+                      else f"    {name}: n/a")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print(f"Compared with {args.compare}:")
+            print('\n'.join(compare(json.load(f), results)))
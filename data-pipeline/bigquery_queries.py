@@ -3,18 +3,152 @@ BigQuery queries and analytics for insider risk data.
 These queries can be used to generate insights and feed the Next.js API.
 """
 
-from google.cloud import bigquery
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from analytics_backends import BigQueryBackend, SQLiteBackend
+from query_cache import (
+    DEFAULT_MAX_BYTES,
+    DEFAULT_MAX_ENTRIES,
+    DEFAULT_TTL_SECONDS,
+    QueryCache,
+    make_cache_key,
+)
+
+# Queries run_queries submits at once; query jobs mostly wait on the
+# backend, so threads overlap them despite the GIL
+DEFAULT_MAX_CONCURRENT_QUERIES = 8
 
 
 class BigQueryAnalytics:
-    """Handle BigQuery analytics queries."""
+    """
+    Handle BigQuery analytics queries.
+    Queries take their values as query parameters, so the query text is
+    constant per method and identical calls hit the in-process result
+    cache (cache_ttl_seconds=0 disables it). Cached DataFrames are shared
+    between callers and must be treated as read-only.
+
+    Pass backend=SQLiteBackend(db_path) to run the same queries on a
+    local SQLite database instead of BigQuery. The BigQuery client is
+    only created when the first query runs.
+
+    fetch_dashboard() and run_queries() run several queries concurrently
+    on a shared pool of max_concurrent_queries threads, so they take
+    about as long as the slowest query.
+    """
+    
+    def __init__(self, project_id=None, dataset_id=None, backend=None,
+                 cache_ttl_seconds=DEFAULT_TTL_SECONDS,
+                 cache_max_entries=DEFAULT_MAX_ENTRIES,
+                 cache_max_bytes=DEFAULT_MAX_BYTES,
+                 max_concurrent_queries=DEFAULT_MAX_CONCURRENT_QUERIES):
+        if backend is None:
+            backend = BigQueryBackend(project_id, dataset_id)
+        self.backend = backend
+        self.cache = None
+        if cache_ttl_seconds > 0:
+            self.cache = QueryCache(
+                cache_ttl_seconds, cache_max_entries, cache_max_bytes
+            )
+        self.max_concurrent_queries = max_concurrent_queries
+        self._executor = None
+        self._executor_lock = threading.Lock()
+    
+    def run_query(self, query, params=None):
+        """
+        Run a query in the backend's dialect with parameters given as
+        {name: (type, value)}, e.g. {'days': ('INT64', 30)}, through the
+        result cache.
+        """
+        params = params or {}
+        
+        def execute():
+            return self.backend.run(query, params)
+        
+        if self.cache is None:
+            return execute()
+        return self.cache.get_or_compute(
+            make_cache_key(query, params), execute
+        )
+    
+    def _pool(self):
+        """Query thread pool, started on first use and then reused."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrent_queries,
+                    thread_name_prefix='analytics-query',
+                )
+            return self._executor
+    
+    def run_queries(self, queries):
+        """
+        Run {name: (query, params)} concurrently and return
+        {name: DataFrame} once all have finished. Each query goes through
+        the result cache; the first failure is raised.
+        """
+        futures = {
+            name: self._pool().submit(self.run_query, query, params)
+            for name, (query, params) in queries.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+    
+    def fetch_dashboard(self, user_id=None, limit=100, risk_level=None,
+                        days=30):
+        """
+        Recent events, the daily summary and (with user_id) that user's
+        risk profile over the last days days, fetched concurrently.
+        Returns {'events': ..., 'summary': ..., 'user_profile': ...}.
+        """
+        queries = {
+            'events': self.risk_events_query(limit, risk_level, days),
+            'summary': self.risk_summary_query(days),
+        }
+        if user_id is not None:
+            queries['user_profile'] = self.user_risk_profile_query(
+                user_id, days
+            )
+        return self.run_queries(queries)
     
-    def __init__(self, project_id, dataset_id):
-        self.client = bigquery.Client(project=project_id)
-        self.dataset_id = dataset_id
+    def close(self):
+        """Stop the query thread pool (a later call starts a new one)."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
     
-    def get_risk_events(self, limit=100, risk_level=None):
-        """Query risk events from BigQuery."""
+    def explain(self, query, params=None):
+        """
+        Describe the scan a query would do without running it: bytes
+        processed from a BigQuery dry run, or the SQLite query plan.
+        Use with the *_query builders, e.g.
+        analytics.explain(*analytics.risk_summary_query(days=7)).
+        """
+        return self.backend.explain(query, params or {})
+    
+    def _time_filter(self, days):
+        """
+        WHERE clause and params restricting timestamp to the last days
+        days (None = all time). The filter is a constant expression on
+        timestamp, so BigQuery prunes the older daily partitions of
+        risk_events as the pipeline creates it (EVENT_TABLE_PARAMETERS
+        in dataflow_pipeline.py) and SQLite uses idx_timestamp.
+        """
+        if days is None:
+            return 'TRUE', {}
+        clause = f"timestamp >= {self.backend.days_ago('days')}"
+        return clause, {'days': ('INT64', int(days))}
+    
+    def risk_events_query(self, limit=100, risk_level=None, days=None):
+        """Query text and params for get_risk_events."""
+        b = self.backend
+        time_filter, params = self._time_filter(days)
+        level_filter = 'TRUE'
+        if risk_level:
+            # Clustered column: lets BigQuery skip non-matching blocks
+            level_filter = f"risk_level = {b.param('risk_level')}"
+            params['risk_level'] = ('STRING', risk_level)
+        params['limit'] = ('INT64', int(limit))
         query = f"""
         SELECT 
             user_id,
@@ -22,19 +156,25 @@ class BigQueryAnalytics:
             timestamp,
             risk_score,
             risk_level
-        FROM `{self.client.project}.{self.dataset_id}.risk_events`
-        WHERE 1=1
+        FROM {b.table('risk_events')}
+        WHERE {time_filter} AND {level_filter}
+        ORDER BY timestamp DESC
+        LIMIT {b.param('limit')}
         """
-        
-        if risk_level:
-            query += f" AND risk_level = '{risk_level}'"
-        
-        query += f" ORDER BY timestamp DESC LIMIT {limit}"
-        
-        return self.client.query(query).to_dataframe()
+        return query, params
     
-    def get_risk_summary(self, days=30):
-        """Get aggregated risk summary."""
+    def get_risk_events(self, limit=100, risk_level=None, days=None):
+        """
+        Query risk events from BigQuery.
+        Pass days to scan only recent events.
+        """
+        return self.run_query(
+            *self.risk_events_query(limit, risk_level, days)
+        )
+    
+    def risk_summary_query(self, days=30):
+        """Query text and params for get_risk_summary."""
+        time_filter, params = self._time_filter(days)
         query = f"""
         SELECT 
             DATE(timestamp) as date,
@@ -42,42 +182,157 @@ class BigQueryAnalytics:
             COUNT(*) as event_count,
             AVG(risk_score) as avg_risk_score,
             MAX(risk_score) as max_risk_score
-        FROM `{self.client.project}.{self.dataset_id}.risk_events`
-        WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {days} DAY)
+        FROM {self.backend.table('risk_events')}
+        WHERE {time_filter}
         GROUP BY date, risk_level
         ORDER BY date DESC
         """
-        
-        return self.client.query(query).to_dataframe()
+        return query, params
     
-    def get_user_risk_profile(self, user_id):
-        """Get risk profile for a specific user."""
+    def get_risk_summary(self, days=30):
+        """Get aggregated risk summary."""
+        return self.run_query(*self.risk_summary_query(days))
+    
+    def user_risk_profile_query(self, user_id, days=None):
+        """Query text and params for get_user_risk_profile."""
+        b = self.backend
+        time_filter, params = self._time_filter(days)
+        params['user_id'] = ('STRING', str(user_id))
         query = f"""
         SELECT 
             user_id,
             COUNT(*) as total_events,
             AVG(risk_score) as avg_risk_score,
             MAX(risk_score) as max_risk_score,
-            COUNTIF(risk_level = 'HIGH') as high_risk_events
-        FROM `{self.client.project}.{self.dataset_id}.risk_events`
-        WHERE user_id = '{user_id}'
+            {b.countif("risk_level = 'HIGH'")} as high_risk_events
+        FROM {b.table('risk_events')}
+        WHERE {time_filter} AND user_id = {b.param('user_id')}
         GROUP BY user_id
         """
+        return query, params
+    
+    def get_user_risk_profile(self, user_id, days=None):
+        """
+        Get risk profile for a specific user.
+        Pass days to scan only recent events.
+        """
+        return self.run_query(*self.user_risk_profile_query(user_id, days))
+    
+    def risk_sketches_query(self, days=7, risk_level=None):
+        """
+        Query text and params for the risk_sketches rows (written by the
+        pipeline with --sketches) of the last days days.
+        """
+        b = self.backend
+        params = {'days': ('INT64', int(days))}
+        level_filter = 'TRUE'
+        if risk_level:
+            level_filter = f"risk_level = {b.param('risk_level')}"
+            params['risk_level'] = ('STRING', risk_level)
+        query = f"""
+        SELECT
+            date,
+            risk_level,
+            event_count,
+            user_hll,
+            user_risk_topk
+        FROM {b.table('risk_sketches')}
+        WHERE date >= DATE({b.days_ago('days')}) AND {level_filter}
+        """
+        return query, params
+    
+    def _merged_sketches(self, days, risk_level):
+        from risk_sketches import merge_sketch_rows
         
-        return self.client.query(query).to_dataframe()
+        rows = self.run_query(*self.risk_sketches_query(days, risk_level))
+        return merge_sketch_rows(rows.to_dict('records'))
+    
+    def get_distinct_users(self, days=7, risk_level=None):
+        """
+        Approximate number of distinct users with events (of risk_level,
+        if given) in the last days days, from the daily sketches instead
+        of a scan of risk_events.
+        """
+        return self._merged_sketches(days, risk_level)[1].count()
+    
+    def get_top_risky_users(self, k=100, days=7, risk_level=None):
+        """
+        The k users with the highest summed risk_score over the last days
+        days as [(user_id, score)], from the daily sketches. Scores are
+        Count-Min estimates and can only overcount.
+        """
+        return self._merged_sketches(days, risk_level)[2].top(k)
+    
+    def iter_record_batches(self, query, params=None):
+        """
+        Stream a query's results as pyarrow RecordBatches (through the
+        BigQuery Storage Read API on BigQuery), so memory stays bounded by
+        one batch. Bulk reads bypass the result cache.
+        """
+        return self.backend.iter_record_batches(query, params or {})
+    
+    def iter_training_columns(self, days=None, feature_columns=()):
+        """
+        Stream risk_events as per-batch NumPy column dicts for
+        SimpleAnomalyDetector.train_columnar/update_columnar: user_id,
+        hour_of_day and any extra feature_columns present in the table
+        (missing features fall back to the detector defaults).
+        """
+        b = self.backend
+        time_filter, params = self._time_filter(days)
+        columns = ''.join(f",\n            {name}" for name in feature_columns)
+        query = f"""
+        SELECT
+            user_id,
+            {b.hour('timestamp')} as hour_of_day{columns}
+        FROM {b.table('risk_events')}
+        WHERE {time_filter}
+        """
+        for batch in self.iter_record_batches(query, params):
+            yield record_batch_to_arrays(batch)
+
+
+def record_batch_to_arrays(batch):
+    """
+    Convert a pyarrow RecordBatch to a dict of NumPy arrays. Numeric
+    columns without nulls are zero-copy views of the Arrow buffers;
+    strings, booleans and columns with nulls are copied.
+    """
+    arrays = {}
+    for name, column in zip(batch.schema.names, batch.columns):
+        try:
+            arrays[name] = column.to_numpy(zero_copy_only=True)
+        except ValueError:  # pyarrow.ArrowInvalid: a copy is needed
+            arrays[name] = column.to_numpy(zero_copy_only=False)
+    return arrays
 
 
 if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--project_id', default='your-project-id')
+    parser.add_argument('--dataset_id', default='insider_risk')
+    parser.add_argument('--db_path', default=None,
+                        help='Query a local SQLite database instead of '
+                             'BigQuery (e.g. ../databases/insider_risk.db)')
+    args = parser.parse_args()
+    
     # Example usage
-    analytics = BigQueryAnalytics('your-project-id', 'insider_risk')
+    if args.db_path:
+        analytics = BigQueryAnalytics(backend=SQLiteBackend(args.db_path))
+    else:
+        analytics = BigQueryAnalytics(args.project_id, args.dataset_id)
     
-    # Get recent events
-    events = analytics.get_risk_events(limit=50)
+    # Get recent events and the summary in one concurrent fetch
+    dashboard = analytics.fetch_dashboard(limit=50, days=7)
     print("Recent Events:")
-    print(events.head())
+    print(dashboard['events'].head())
     
-    # Get summary
-    summary = analytics.get_risk_summary(days=7)
     print("\nRisk Summary:")
-    print(summary)
+    print(dashboard['summary'])
+    
+    # Scan done by the summary (bytes on BigQuery, plan on SQLite)
+    print("\nRisk Summary Scan:")
+    print(analytics.explain(*analytics.risk_summary_query(days=7)))
 
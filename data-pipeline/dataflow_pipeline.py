@@ -7,176 +7,836 @@ from __future__ import annotations
 
 import json
 import logging
-from typing import Any, Dict, Iterator, TYPE_CHECKING
+import os
+import time
+from typing import (
+    Any, Callable, Dict, FrozenSet, Iterator, List, Tuple, TYPE_CHECKING
+)
 
 import apache_beam as beam
-from apache_beam.io import ReadFromText, WriteToBigQuery
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from apache_beam.io import (
+    ReadFromPubSub,
+    ReadFromText,
+    WriteToBigQuery,
+    WriteToText,
+)
 from apache_beam.io.gcp.bigquery import BigQueryDisposition
+from apache_beam.metrics import Metrics
+from apache_beam.metrics.metric import MetricsFilter
 from apache_beam.options.pipeline_options import PipelineOptions
 
+from dedup import DEDUP_KEYS, DeduplicateEvents
+from event_decoding import (
+    DECODER_BACKENDS,
+    RISK_EVENT_FIELDS,
+    RISK_FLAG_FIELDS,
+    RiskEvent,
+    get_decoder,
+)
+from ml_anomaly_detection import SimpleAnomalyDetector, enhance_events_with_ml
+from parquet_io import ReadRiskEventsFromParquet, WriteParquetArchive
+from risk_rules import (
+    DEFAULT_RISK_RULES,
+    FLAG_BITS,
+    OTHER_TAG,
+    ROUTE_TAGS,
+    RiskRules,
+    RulesWatcher,
+    SENSITIVE_TAG,
+)
+from risk_sketches import (
+    RISK_SKETCH_PARAMETERS,
+    RISK_SKETCH_SCHEMA,
+    DailyRiskSketches,
+)
+from risk_windows import (
+    USER_RISK_WINDOW_PARAMETERS,
+    USER_RISK_WINDOW_SCHEMA,
+    WindowedUserRisk,
+)
+from sqlite_source import ReadRiskEventsFromSqlite
+
 if TYPE_CHECKING:
     from apache_beam.pvalue import PCollection, PValue
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Workers import this directory's modules by name when unpickling DoFns:
+# Dataflow installs them from setup.py, local worker processes find them
+# through PYTHONPATH
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+SETUP_FILE = os.path.join(PIPELINE_DIR, 'setup.py')
+
+# Beam Metrics namespace for event counts and stage timings
+METRICS_NAMESPACE = 'insider_risk'
+
+# The per-element path times one element in this many; timing every
+# element would cost about as much as the work being measured
+TIMING_SAMPLE_EVERY = 64
+
+
+class _DecodingDoFn(beam.DoFn):
+    """
+    Base DoFn that decodes JSON lines or row dicts into RiskEvents.
+    Reports events_parsed/events_failed counters, per-risk-level counters
+    and last-bundle gauges, and decode_ns_per_event/score_ns_per_event
+    distributions. Counts are kept in plain ints and flushed to Beam
+    Metrics once per bundle.
+
+    Scores come from the compiled rules of rules_path (default: the
+    built-in risk_rules.DEFAULT_RULES); edits to the file are picked up
+    between bundles.
+    """
+
+    def __init__(
+        self, decoder: str = 'auto', rules_path: str | None = None
+    ) -> None:
+        # Backend name only; the decoder itself is built in setup()
+        self._decoder_backend = decoder
+        self._decode: Callable[[str | bytes], RiskEvent] | None = None
+        self._rules_path = rules_path
+        self._rules_watcher: RulesWatcher | None = None
+        self._rules: RiskRules = DEFAULT_RISK_RULES
+        self._failed = Metrics.counter(METRICS_NAMESPACE, 'events_failed')
+        self._parsed = Metrics.counter(METRICS_NAMESPACE, 'events_parsed')
+        self._decode_ns = Metrics.distribution(
+            METRICS_NAMESPACE, 'decode_ns_per_event'
+        )
+        self._score_ns = Metrics.distribution(
+            METRICS_NAMESPACE, 'score_ns_per_event'
+        )
+        self._elements = 0
+        self._bundle_failed = 0
+        self._bundle_levels: Dict[str, int] = {}
+
+    def setup(self) -> None:
+        self._decode = get_decoder(self._decoder_backend)
+        if self._rules_path and self._rules_watcher is None:
+            self._rules_watcher = RulesWatcher(self._rules_path)
+            self._rules = self._rules_watcher.rules
+
+    def start_bundle(self) -> None:
+        # Rule reloads happen here, never on the per-element path
+        if self._rules_watcher is not None:
+            self._rules = self._rules_watcher.poll()
+
+    def finish_bundle(self) -> None:
+        if self._bundle_failed:
+            self._failed.inc(self._bundle_failed)
+        parsed = 0
+        for level, count in self._bundle_levels.items():
+            name = f'events_{str(level).lower()}'
+            Metrics.counter(METRICS_NAMESPACE, name).inc(count)
+            Metrics.gauge(METRICS_NAMESPACE, f'{name}_last_bundle').set(count)
+            parsed += count
+        if parsed:
+            self._parsed.inc(parsed)
+        self._bundle_failed = 0
+        self._bundle_levels = {}
 
-class ProcessRiskEvents(beam.DoFn):
+    def _count_level(self, level: Any) -> None:
+        levels = self._bundle_levels
+        levels[level] = levels.get(level, 0) + 1
+
+    def _to_event(self, element: str | bytes | Dict[str, Any]) -> RiskEvent:
+        """Decode a JSON line, or wrap an already-decoded row."""
+        if isinstance(element, (str, bytes)):
+            if self._decode is None:
+                self.setup()
+            return self._decode(element)  # type: ignore[misc]
+        # Normalizes SQLite INTEGER 0/1 flags and lowercases event_type
+        return RiskEvent.from_mapping(element)
+
+
+class ProcessRiskEvents(_DecodingDoFn):
     """Process individual risk events and calculate risk scores."""
 
     def process(
-        self, element: str | Dict[str, Any]
+        self, element: str | bytes | Dict[str, Any]
     ) -> Iterator[Dict[str, Any]]:
         """Process a single event and yield enriched data."""
+        self._elements += 1
+        timed = self._elements % TIMING_SAMPLE_EVERY == 0
         try:
-            event = (
-                json.loads(element)
-                if isinstance(element, str)
-                else element
-            )
+            start = time.perf_counter_ns() if timed else 0
+            # Decoding also normalizes SQLite data format (INTEGER 0/1 to
+            # boolean), handling both SQLite and JSON (true/false) formats
+            event = self._to_event(element)
+            decoded = time.perf_counter_ns() if timed else 0
 
-            # Normalize SQLite data format (convert INTEGER 0/1 to boolean)
-            # Handle both SQLite format (0/1) and JSON format (true/false)
-            event = self._normalize_event(event)
-
-            # Calculate risk score (simplified example)
-            # Only recalculate if not already present
-            if 'risk_score' not in event or event.get('risk_score') is None:
-                risk_score = self._calculate_risk_score(event)
-                event['risk_score'] = risk_score
-                event['risk_level'] = self._determine_risk_level(risk_score)
-            else:
+            # Score from the flags only if not already present
+            if event.risk_score is None:
+                event.risk_score, event.risk_level = (
+                    self._rules.score_and_level(event)
+                )
+            elif event.risk_level is None:
                 # Ensure risk_level is set if risk_score exists
-                if ('risk_level' not in event or
-                        event.get('risk_level') is None):
-                    event['risk_level'] = self._determine_risk_level(
-                        int(event['risk_score'])
-                    )
+                event.risk_level = self._rules.level(int(event.risk_score))
 
-            yield event
+            if timed:
+                self._decode_ns.update(decoded - start)
+                self._score_ns.update(time.perf_counter_ns() - decoded)
+            self._count_level(event.risk_level)
+            yield event.to_dict()
         except Exception as e:
+            self._bundle_failed += 1
             logger.error(f"Error processing event: {e}")
 
-    def _normalize_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
-        """Normalize event data from SQLite format (0/1) to boolean."""
-        normalized = event.copy()
-        
-        # Convert INTEGER 0/1 to boolean for risk calculation
-        bool_fields = [
-            'sensitive_data_access',
-            'unusual_time',
-            'large_data_transfer',
-            'privileged_action'
-        ]
-        
-        for field in bool_fields:
-            value = normalized.get(field)
-            if isinstance(value, int):
-                normalized[field] = bool(value)
-            elif isinstance(value, str):
-                normalized[field] = value.lower() in ('1', 'true', 'yes')
-        
-        # Normalize event_type to lowercase for filtering
-        if 'event_type' in normalized:
-            normalized['event_type'] = str(normalized['event_type']).lower()
-        
-        return normalized
-
-    def _calculate_risk_score(self, event: Dict[str, Any]) -> int:
-        """Calculate risk score based on event attributes."""
-        # Simplified risk scoring logic
-        base_score = 0
-        if event.get('sensitive_data_access', False):
-            base_score += 30
-        if event.get('unusual_time', False):
-            base_score += 20
-        if event.get('large_data_transfer', False):
-            base_score += 40
-        if event.get('privileged_action', False):
-            base_score += 25
-
-        return min(base_score, 100)
-
-    def _determine_risk_level(self, score: int) -> str:
-        """Determine risk level based on score."""
-        if score >= 70:
-            return 'HIGH'
-        elif score >= 40:
-            return 'MEDIUM'
+
+# Flag text normalize_flag reads as True
+_TRUE_FLAG_TEXT = pa.array(['1', 'true', 'yes'])
+
+
+def _is_text(arrow_type: pa.DataType) -> bool:
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(
+        arrow_type
+    )
+
+
+def _flag_column(column: pa.ChunkedArray) -> pa.ChunkedArray | None:
+    """
+    A flag column normalized as normalize_flag does (integers and
+    '1'/'true'/'yes' text to bool, nulls kept), or None for a type
+    normalize_flag passes through unchanged.
+    """
+    if pa.types.is_boolean(column.type) or pa.types.is_null(column.type):
+        return column
+    if pa.types.is_integer(column.type):
+        return pc.not_equal(column, 0)
+    if _is_text(column.type):
+        flags = pc.is_in(pc.utf8_lower(column), value_set=_TRUE_FLAG_TEXT)
+        return pc.if_else(
+            pc.is_valid(column), flags, pa.scalar(None, pa.bool_())
+        )
+    return None
+
+
+def _set_column(
+    table: pa.Table, name: str, column: pa.ChunkedArray | pa.Array
+) -> pa.Table:
+    index = table.schema.get_field_index(name)
+    if index < 0:
+        return table.append_column(name, column)
+    return table.set_column(index, name, column)
+
+
+class ProcessRiskEventsBatched(ProcessRiskEvents):
+    """
+    ProcessRiskEvents for Arrow record batches, as read from Parquet by
+    ReadRiskEventsFromParquet(record_batches=True). Flags are normalized
+    a column at a time into a NumPy flag matrix, the batch is scored
+    with one lookup in the rules' score table and risk levels are
+    bucketed with np.digitize; the rows are built once by to_pylist().
+    Output matches ProcessRiskEvents on the batch's rows. Batches with
+    column types this does not handle (e.g. float flags) are processed
+    row by row.
+    """
+
+    def process(  # type: ignore[override]
+        self, batch: pa.Table
+    ) -> Iterator[Dict[str, Any]]:
+        """Score a record batch and yield its enriched rows."""
+        if not batch.num_rows:
+            return
+        start = time.perf_counter_ns()
+        scored = self._score_table(batch)
+        if scored is None:
+            for row in batch.to_pylist():
+                yield from super().process(row)
+            return
+        table, levels = scored
+        scored_at = time.perf_counter_ns()
+
+        rows = table.to_pylist()
+        # Unset risk_events columns are left out, as in RiskEvent.to_dict
+        for name in RISK_EVENT_FIELDS:
+            index = table.schema.get_field_index(name)
+            if index >= 0 and table.column(index).null_count:
+                nulls = pc.is_null(table.column(index)).to_numpy(
+                    zero_copy_only=False
+                )
+                for i in np.flatnonzero(nulls).tolist():
+                    del rows[i][name]
+
+        for level, count in zip(*np.unique(levels, return_counts=True)):
+            self._bundle_levels[level] = (
+                self._bundle_levels.get(level, 0) + int(count)
+            )
+        if rows:
+            # Batch timings spread evenly over the batch's events
+            self._score_ns.update((scored_at - start) // len(rows))
+            self._decode_ns.update(
+                (time.perf_counter_ns() - scored_at) // len(rows)
+            )
+        yield from rows
+
+    def _score_table(
+        self, table: pa.Table
+    ) -> Tuple[pa.Table, np.ndarray] | None:
+        """
+        The batch with normalized event_type and flags and with
+        risk_score/risk_level filled in, in RISK_EVENT_FIELDS order, and
+        its risk levels; None if a column type is not handled.
+        """
+        count = table.num_rows
+        names = set(table.column_names)
+
+        flags = np.zeros((count, len(RISK_FLAG_FIELDS)), dtype=bool)
+        for i, name in enumerate(RISK_FLAG_FIELDS):
+            if name not in names:
+                continue
+            column = _flag_column(table.column(name))
+            if column is None:
+                return None
+            table = _set_column(table, name, column)
+            if not pa.types.is_null(column.type):
+                flags[:, i] = pc.fill_null(column, False).to_numpy(
+                    zero_copy_only=False
+                )
+        scores = self._rules.score_lut[flags @ FLAG_BITS]
+
+        if 'event_type' in names:
+            column = table.column('event_type')
+            if _is_text(column.type):
+                table = _set_column(table, 'event_type', pc.utf8_lower(column))
+            elif not pa.types.is_null(column.type):
+                return None
+
+        # Existing scores are kept; rows without one get the flag score
+        score_column = (
+            table.column('risk_score') if 'risk_score' in names else None
+        )
+        if score_column is None or pa.types.is_null(score_column.type):
+            missing = np.ones(count, dtype=bool)
+            existing = np.zeros(count)
+        elif (pa.types.is_integer(score_column.type)
+              or pa.types.is_floating(score_column.type)):
+            missing = pc.is_null(score_column).to_numpy(zero_copy_only=False)
+            existing = np.asarray(
+                score_column.to_numpy(zero_copy_only=False), dtype=np.float64
+            )
         else:
-            return 'LOW'
+            return None
+
+        level_column = (
+            table.column('risk_level') if 'risk_level' in names else None
+        )
+        if level_column is None or pa.types.is_null(level_column.type):
+            level_missing = np.ones(count, dtype=bool)
+            existing_levels = np.full(count, None, dtype=object)
+        elif _is_text(level_column.type):
+            level_missing = pc.is_null(level_column).to_numpy(
+                zero_copy_only=False
+            )
+            existing_levels = np.asarray(
+                level_column.to_numpy(zero_copy_only=False), dtype=object
+            )
+        else:
+            return None
+
+        # A score without a level is bucketed on the truncated score, as
+        # in ProcessRiskEvents, where int() fails the event for NaN/inf
+        rebucket = ~missing & level_missing
+        valid = ~rebucket | np.isfinite(existing)
+        level_scores = np.where(
+            missing, scores, np.trunc(np.where(valid, existing, 0))
+        )
+        levels = np.where(
+            missing | level_missing,
+            self._rules.levels(level_scores),
+            existing_levels,
+        )
+
+        if missing.all():
+            table = _set_column(table, 'risk_score', pa.array(scores))
+        elif missing.any():
+            table = _set_column(table, 'risk_score', pc.if_else(
+                pa.array(missing),
+                pa.array(scores).cast(score_column.type),
+                score_column,
+            ))
+        table = _set_column(
+            table, 'risk_level', pa.array(levels, type=pa.string())
+        )
+
+        if not valid.all():
+            for value in existing[~valid].tolist():
+                self._bundle_failed += 1
+                logger.error(
+                    f"Error processing event: risk_score {value!r} "
+                    "has no risk level"
+                )
+            table = table.filter(pa.array(valid))
+            levels = levels[valid]
+
+        present = set(table.column_names)
+        known = [name for name in RISK_EVENT_FIELDS if name in present]
+        extra = [name for name in table.column_names if name not in known]
+        return table.select(known + extra), levels
+
+
+class ScoreRiskEventsWithML(beam.DoFn):
+    """
+    Add ml_anomaly_score, ml_is_anomaly and combined_risk_score to each
+    event. Baselines saved with SimpleAnomalyDetector.save() are
+    memory-mapped once per worker in setup(), and events are scored a
+    batch at a time with predict_batch.
+    """
+
+    def __init__(self, baseline_path: str) -> None:
+        self._baseline_path = baseline_path
+        self._detector: SimpleAnomalyDetector | None = None
+        self._scored = Metrics.counter(METRICS_NAMESPACE, 'ml_scored')
+        self._anomalies = Metrics.counter(METRICS_NAMESPACE, 'ml_anomalies')
+        self._score_ns = Metrics.distribution(
+            METRICS_NAMESPACE, 'ml_score_ns_per_event'
+        )
+
+    def setup(self) -> None:
+        self._detector = SimpleAnomalyDetector.load(self._baseline_path)
+
+    def get_input_batch_type(self, input_element_type: Any) -> Any:
+        return List[input_element_type]  # type: ignore[valid-type]
+
+    def infer_output_type(self, input_type: Any) -> Any:
+        return Dict[str, Any]
+
+    def get_output_batch_type(self, input_element_type: Any) -> Any:
+        return List[Dict[str, Any]]
+
+    def process_batch(
+        self, batch: List[Dict[str, Any]]
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Score a batch of processed events."""
+        if self._detector is None:
+            self.setup()
+        if not batch:
+            return
+        start = time.perf_counter_ns()
+        # Rows are fresh dicts from ProcessEvents with no other consumer,
+        # so they are enriched in place rather than copied
+        enhance_events_with_ml(batch, self._detector)  # type: ignore[arg-type]
+        self._score_ns.update((time.perf_counter_ns() - start) // len(batch))
+        self._scored.inc(len(batch))
+        self._anomalies.inc(sum(event['ml_is_anomaly'] for event in batch))
+        yield batch
 
 
 # Typed filter functions for event routing
+# Each filter_* function applies one table's routing rule from the default
+# rules (risk_rules.DEFAULT_RULES); RouteRiskEvents applies them all at once
+
+
 def filter_access_events(event: Dict[str, Any]) -> bool:
     """Filter for access-related events."""
-    # Handle both lowercase (normalized) and uppercase (SQLite) formats
-    event_type = str(event.get('event_type', '')).lower()
-    return 'access' in event_type or 'file' in event_type
+    return 'access' in DEFAULT_RISK_RULES.routes(event)
 
 
 def filter_data_transfer_events(event: Dict[str, Any]) -> bool:
     """Filter for data transfer events."""
-    # Handle both lowercase (normalized) and uppercase (SQLite) formats
-    event_type = str(event.get('event_type', '')).lower()
-    return (
-        'transfer' in event_type or
-        'download' in event_type or
-        'export' in event_type
-    )
+    return 'data_transfer' in DEFAULT_RISK_RULES.routes(event)
 
 
 def filter_privileged_events(event: Dict[str, Any]) -> bool:
     """Filter for privileged action events."""
-    # Handle both lowercase (normalized) and uppercase (SQLite) formats
-    event_type = str(event.get('event_type', '')).lower()
-    return 'privileged' in event_type or 'admin' in event_type
+    return 'privileged' in DEFAULT_RISK_RULES.routes(event)
 
 
 def filter_auth_events(event: Dict[str, Any]) -> bool:
     """Filter for authentication events."""
-    # Handle both lowercase (normalized) and uppercase (SQLite) formats
-    event_type = str(event.get('event_type', '')).lower()
-    return 'authentication' in event_type or 'login' in event_type
+    return 'authentication' in DEFAULT_RISK_RULES.routes(event)
 
 
 def filter_sensitive_data_events(event: Dict[str, Any]) -> bool:
     """Filter for sensitive data access events."""
-    return (
-        event.get('sensitive_data_access', False) or
-        'sensitive' in event.get('event_type', '').lower()
-    )
+    return SENSITIVE_TAG in DEFAULT_RISK_RULES.routes(event)
 
 
 def filter_other_events(event: Dict[str, Any]) -> bool:
     """Filter for events that don't match other categories."""
-    # Handle both lowercase (normalized) and uppercase (SQLite) formats
-    event_type = str(event.get('event_type', '')).lower()
-    # Convert sensitive_data_access to boolean if needed
-    sensitive_access = event.get('sensitive_data_access', False)
-    if isinstance(sensitive_access, int):
-        sensitive_access = bool(sensitive_access)
-    
-    return not any([
-        'access' in event_type,
-        'transfer' in event_type,
-        'download' in event_type,
-        'export' in event_type,
-        'privileged' in event_type,
-        'admin' in event_type,
-        'authentication' in event_type,
-        'login' in event_type,
-        sensitive_access
-    ])
+    return OTHER_TAG in DEFAULT_RISK_RULES.routes(event)
+
+
+class RouteRiskEvents(beam.DoFn):
+    """
+    Classify each event once and emit it to every matching tagged output.
+    Equivalent to applying all six filter_* functions, but the event_type
+    is matched by one compiled pattern and the result cached per
+    event_type. Routing keywords come from rules_path (see
+    _DecodingDoFn), reloaded between bundles.
+    """
+
+    def __init__(self, rules_path: str | None = None) -> None:
+        self._rules_path = rules_path
+        self._rules_watcher: RulesWatcher | None = None
+        self._rules: RiskRules = DEFAULT_RISK_RULES
+        # Events per output tag in the current bundle (routed_<tag>)
+        self._bundle_routed: Dict[str, int] = {}
+
+    def setup(self) -> None:
+        if self._rules_path and self._rules_watcher is None:
+            self._rules_watcher = RulesWatcher(self._rules_path)
+            self._rules = self._rules_watcher.rules
+
+    def start_bundle(self) -> None:
+        if self._rules_watcher is not None:
+            self._rules = self._rules_watcher.poll()
+
+    def finish_bundle(self) -> None:
+        for tag, count in self._bundle_routed.items():
+            Metrics.counter(METRICS_NAMESPACE, f'routed_{tag}').inc(count)
+        self._bundle_routed = {}
+
+    def process(
+        self, event: Dict[str, Any]
+    ) -> Iterator[beam.pvalue.TaggedOutput]:
+        """Emit the event to each table it belongs to."""
+        routed = self._bundle_routed
+        for tag in self._rules.routes(event):
+            routed[tag] = routed.get(tag, 0) + 1
+            yield beam.pvalue.TaggedOutput(tag, event)
+
+
+# BigQuery table and step-name suffix for each routed output tag
+EVENT_TABLES: Tuple[Tuple[str, str, str], ...] = (
+    ('access', 'access_events', 'AccessEvents'),
+    ('data_transfer', 'data_transfer_events', 'DataTransferEvents'),
+    ('privileged', 'privileged_action_events', 'PrivilegedEvents'),
+    ('authentication', 'authentication_events', 'AuthEvents'),
+    (SENSITIVE_TAG, 'sensitive_data_access_events', 'SensitiveDataEvents'),
+    (OTHER_TAG, 'other_events', 'OtherEvents'),
+)
+
+
+# Runner modes: 'dataflow' writes to BigQuery, local modes write JSONL files
+RUNNERS: Dict[str, str] = {
+    'dataflow': 'DataflowRunner',
+    'direct': 'DirectRunner',
+    'prism': 'PrismRunner',
+}
+LOCAL_RUNNERS: FrozenSet[str] = frozenset({'direct', 'prism'})
+
+# Daily partitions on timestamp and clustering on the columns analytics
+# queries filter by, so time-bounded queries scan only recent partitions
+EVENT_TABLE_PARAMETERS: Dict[str, Any] = {
+    'timePartitioning': {'type': 'DAY', 'field': 'timestamp'},
+    'clustering': {'fields': ['risk_level', 'user_id']},
+}
+
+# --write_method choices; 'default' lets Beam pick (FILE_LOADS for batch,
+# STREAMING_INSERTS for streaming pipelines)
+WRITE_METHODS: Dict[str, str] = {
+    'default': WriteToBigQuery.Method.DEFAULT,
+    'storage_write_api': WriteToBigQuery.Method.STORAGE_WRITE_API,
+    'file_loads': WriteToBigQuery.Method.FILE_LOADS,
+    'streaming_inserts': WriteToBigQuery.Method.STREAMING_INSERTS,
+}
+
+# Metrics namespace of the per-table <table>_rows/<table>_bytes counters
+SINK_METRICS_NAMESPACE = 'sinks'
+
+# BigQuery sinks JSON-encode one row in this many for <table>_bytes and
+# count it this many times, instead of encoding every row a second time
+SINK_BYTES_SAMPLE_EVERY = 64
+
+# 'jsonl' reads JSON lines (gzip/bzip2/zstd by file extension); 'parquet'
+# reads typed columns from Parquet files; 'sqlite' reads risk_events from
+# a .db file; 'pubsub' streams JSON messages from a Pub/Sub subscription
+INPUT_FORMATS: Tuple[str, ...] = ('jsonl', 'parquet', 'sqlite', 'pubsub')
+
+# Source columns kept in the Parquet archive around the table schema
+ARCHIVE_ID_COLUMN = 'id:INTEGER'
+ARCHIVE_FLAG_COLUMNS = (
+    'sensitive_data_access:BOOLEAN,unusual_time:BOOLEAN,'
+    'large_data_transfer:BOOLEAN,privileged_action:BOOLEAN'
+)
+
+# Table receiving every processed event once, for bigquery_queries.py;
+# written with EVENT_TABLE_PARAMETERS like the routed tables
+RISK_EVENTS_TABLE = 'risk_events'
+
+# Table receiving the sliding-window per-user aggregates
+USER_RISK_WINDOWS_TABLE = 'user_risk_windows'
+
+# Table receiving per-day, per-risk-level user sketches
+RISK_SKETCHES_TABLE = 'risk_sketches'
+
+
+def _export_pipeline_dir() -> None:
+    """
+    Put PIPELINE_DIR on PYTHONPATH so local worker processes, which
+    inherit this environment, can import the pipeline modules however
+    the pipeline was launched.
+    """
+    paths = [
+        path for path in os.environ.get('PYTHONPATH', '').split(os.pathsep)
+        if path
+    ]
+    if PIPELINE_DIR not in paths:
+        os.environ['PYTHONPATH'] = os.pathsep.join([PIPELINE_DIR] + paths)
+
+
+def _pipeline_options(
+    project_id: str,
+    output_path: str,
+    runner: str,
+    num_workers: int,
+    region: str,
+    streaming: bool = False,
+    profile_location: str | None = None,
+    profile_sample_rate: float = 1.0
+) -> PipelineOptions:
+    """
+    Build pipeline options for the selected runner mode. With
+    profile_location, each worker runs bundles under cProfile (Beam's
+    --profile_cpu) and writes the stats files there; profile_sample_rate
+    is the fraction of bundles profiled.
+    """
+    if runner not in RUNNERS:
+        raise ValueError(
+            f"Unknown runner {runner!r}; expected one of {sorted(RUNNERS)}"
+        )
+
+    profiling: List[str] = []
+    if profile_location:
+        profiling = [
+            '--profile_cpu',
+            '--profile_location', profile_location,
+            '--profile_sample_rate', str(profile_sample_rate),
+        ]
+
+    if runner == 'dataflow':
+        return PipelineOptions([
+            '--project', project_id,
+            '--runner', RUNNERS[runner],
+            '--region', region,
+            '--temp_location', output_path,
+            '--staging_location', output_path,
+            '--setup_file', SETUP_FILE,
+        ] + (['--streaming'] if streaming else []) + profiling)
+
+    _export_pipeline_dir()
+    args = ['--runner', RUNNERS[runner]] + profiling
+    if runner == 'direct':
+        # One worker process per core avoids the GIL on a single big box
+        args += [
+            '--direct_num_workers', str(num_workers),
+            '--direct_running_mode',
+            'multi_processing' if num_workers > 1 else 'in_memory',
+        ]
+    return PipelineOptions(args)
+
+
+def _write_options(
+    write_method: str,
+    storage_api_streams: int = 0,
+    triggering_frequency: int | None = None,
+    load_batch_mb: int | None = None
+) -> Dict[str, Any]:
+    """
+    WriteToBigQuery keyword arguments for a write method.
+    storage_api_streams (0 = Beam default) and triggering_frequency
+    (seconds between commits) apply to storage_write_api, which uses them
+    in streaming pipelines. load_batch_mb is the maximum size of each
+    file_loads temporary file (max_file_size); one load job may load
+    several files.
+    """
+    if write_method not in WRITE_METHODS:
+        raise ValueError(
+            f"Unknown write_method {write_method!r}; "
+            f"expected one of {sorted(WRITE_METHODS)}"
+        )
+
+    options: Dict[str, Any] = {'method': WRITE_METHODS[write_method]}
+    if write_method == 'storage_write_api':
+        options['num_storage_api_streams'] = storage_api_streams
+        options['triggering_frequency'] = triggering_frequency
+    elif write_method == 'file_loads' and load_batch_mb:
+        options['max_file_size'] = load_batch_mb * 1024 * 1024
+    return options
+
+
+class CountSinkRows(beam.DoFn):
+    """
+    Count rows and JSON-encoded bytes written to one table as the
+    <table>_rows and <table>_bytes counters of SINK_METRICS_NAMESPACE.
+    With encode=True the JSON line is emitted instead of the row and its
+    bytes are counted exactly; otherwise bytes are estimated from one row
+    in SINK_BYTES_SAMPLE_EVERY.
+    """
+
+    def __init__(self, table: str, encode: bool = False) -> None:
+        self._encode = encode
+        self._rows = Metrics.counter(SINK_METRICS_NAMESPACE, f'{table}_rows')
+        self._bytes = Metrics.counter(
+            SINK_METRICS_NAMESPACE, f'{table}_bytes'
+        )
+        self._elements = 0
+
+    def process(self, row: Dict[str, Any]) -> Iterator[Any]:
+        self._rows.inc()
+        if self._encode:
+            line = json.dumps(row, default=str)
+            self._bytes.inc(len(line.encode('utf-8')))
+            yield line
+            return
+        if self._elements % SINK_BYTES_SAMPLE_EVERY == 0:
+            line = json.dumps(row, default=str)
+            self._bytes.inc(
+                len(line.encode('utf-8')) * SINK_BYTES_SAMPLE_EVERY
+            )
+        self._elements += 1
+        yield row
+
+
+def _event_sink(
+    runner: str,
+    project_id: str,
+    dataset_id: str,
+    table: str,
+    schema: str,
+    output_path: str,
+    write_options: Dict[str, Any],
+    table_parameters: Dict[str, Any] = EVENT_TABLE_PARAMETERS
+) -> beam.PTransform:
+    """
+    Sink for one table: BigQuery on Dataflow, otherwise sharded JSONL
+    files under output_path/<table>/. Rows and bytes are counted per
+    table on the way in.
+    """
+    if runner in LOCAL_RUNNERS:
+        return (
+            beam.ParDo(CountSinkRows(table, encode=True))
+            | WriteToText(
+                os.path.join(output_path, table, 'part'),
+                file_name_suffix='.jsonl'
+            )
+        )
+
+    return (
+        beam.ParDo(CountSinkRows(table))
+        | WriteToBigQuery(
+            table=f'{project_id}:{dataset_id}.{table}',
+            schema=schema,
+            write_disposition=BigQueryDisposition.WRITE_APPEND,
+            create_disposition=BigQueryDisposition.CREATE_IF_NEEDED,
+            additional_bq_parameters=table_parameters,
+            **write_options
+        )
+    )
+
+
+def _namespace_metrics(result: Any, namespace: str) -> Dict[str, Any]:
+    """
+    Committed metrics of one namespace by name, summed over steps:
+    counters as ints, gauges as their latest value and distributions as
+    {count, mean, min, max}.
+    """
+    query = result.metrics().query(MetricsFilter().with_namespace(namespace))
+    values: Dict[str, Any] = {}
+    for counter in query['counters']:
+        name = counter.key.metric.name
+        values[name] = values.get(name, 0) + counter.committed
+    for gauge in query['gauges']:
+        values[gauge.key.metric.name] = gauge.committed.value
+    for dist in query['distributions']:
+        data = dist.committed
+        values[dist.key.metric.name] = {
+            'count': data.count,
+            'mean': data.mean,
+            'min': data.min,
+            'max': data.max,
+        }
+    return dict(sorted(values.items()))
+
+
+def sink_metrics(result: Any) -> Dict[str, int]:
+    """Per-table row and byte counters of a finished run, by name."""
+    return _namespace_metrics(result, SINK_METRICS_NAMESPACE)
+
+
+def pipeline_metrics(result: Any) -> Dict[str, Any]:
+    """Event counts, risk-level gauges and stage timings of a run."""
+    return _namespace_metrics(result, METRICS_NAMESPACE)
 
 
 def run_pipeline(
     project_id: str,
     dataset_id: str,
     input_path: str,
-    output_path: str
-) -> None:
-    """Run the DataFlow pipeline with segmented storage by event_type."""
+    output_path: str,
+    decoder: str = 'auto',
+    runner: str = 'dataflow',
+    num_workers: int = 1,
+    region: str = 'europe-west2',
+    input_format: str = 'jsonl',
+    baseline_path: str | None = None,
+    write_method: str = 'default',
+    storage_api_streams: int = 0,
+    triggering_frequency: int | None = None,
+    load_batch_mb: int | None = None,
+    window_size: int | None = None,
+    window_period: int = 60,
+    profile_location: str | None = None,
+    profile_sample_rate: float = 1.0,
+    dedup: str | None = None,
+    sketches: bool = False,
+    archive_path: str | None = None,
+    rules_path: str | None = None,
+    timestamp_attribute: str | None = None,
+    allowed_lateness: int | None = None
+) -> Any:
+    """
+    Run the DataFlow pipeline with segmented storage by event_type.
+    decoder selects the JSON backend (see event_decoding.get_decoder).
+    runner='direct' or 'prism' runs locally with num_workers processes
+    and writes each table as JSONL files under output_path instead of
+    BigQuery. input_format='sqlite' reads risk_events directly from the
+    SQLite database at input_path in parallel id ranges. With
+    baseline_path, events are also scored by SimpleAnomalyDetector and the
+    ML columns are added to every table. write_method selects how rows
+    are loaded into BigQuery (see _write_options). Returns the finished
+    PipelineResult; sink_metrics(result) gives per-table rows and bytes.
+    Every event is also written once to risk_events, partitioned and
+    clustered like the routed tables, for the bigquery_queries.py
+    analytics.
+
+    input_format='pubsub' runs in streaming mode on Dataflow, reading
+    input_path as a Pub/Sub subscription. With window_size (seconds),
+    per-user aggregates over sliding event-time windows starting every
+    window_period seconds are written to user_risk_windows; locally,
+    replaying a JSONL file produces the same windows in batch.
+    timestamp_attribute names a Pub/Sub message attribute holding the
+    event time, so the watermark follows event time rather than publish
+    time. allowed_lateness (seconds) overrides how long windows and daily
+    sketches accept events behind the watermark (see
+    risk_windows.ALLOWED_LATENESS_SECONDS).
+
+    Every run reports Beam Metrics in the METRICS_NAMESPACE namespace
+    (parsed/failed/routed/ML-scored counts, risk-level gauges and
+    decode/score timings; see pipeline_metrics). profile_location turns
+    on per-worker cProfile output (see _pipeline_options).
+
+    dedup ('id' or 'fields', see dedup.DEDUP_KEYS) drops repeated events
+    after decoding, counting them as duplicates_dropped. With sketches,
+    per-day, per-risk-level HyperLogLog and top-k user sketches are
+    written to risk_sketches (see risk_sketches.merge_sketch_rows).
+
+    input_format='parquet' reads only the columns the pipeline uses from
+    Parquet files (parquet_io.PARQUET_INPUT_COLUMNS) and scores them a
+    record batch at a time (ProcessRiskEventsBatched); JSONL input may be
+    gzip, bzip2 or zstd compressed, detected from the file extension.
+    With archive_path, each routed table is also written as zstd Parquet
+    files under archive_path/<table>/.
+
+    rules_path points at a JSON or YAML rules file (see risk_rules) with
+    the scoring weights, level thresholds and routing keywords; workers
+    check it for changes between bundles.
+    """
 
     # Common schema for all event tables
     event_schema = (
@@ -184,128 +844,283 @@ def run_pipeline(
         'timestamp:TIMESTAMP,risk_score:FLOAT,'
         'risk_level:STRING'
     )
+    if baseline_path:
+        event_schema += (
+            ',ml_anomaly_score:FLOAT,ml_is_anomaly:BOOLEAN,'
+            'combined_risk_score:FLOAT'
+        )
 
-    pipeline_options = PipelineOptions([
-        '--project', project_id,
-        '--runner', 'DataflowRunner',
-        '--region', 'europe-west2',
-        '--temp_location', output_path,
-        '--staging_location', output_path,
-    ])
-
-    with beam.Pipeline(options=pipeline_options) as pipeline:
-        # PCollection of processed risk events
-        # Reads from text files (JSON lines) - can be exported from SQLite
-        processed_events: PCollection[Dict[str, Any]] = (  # type: ignore
-            pipeline
-            | 'ReadEvents' >> ReadFromText(input_path)
-            | 'ProcessEvents' >> beam.ParDo(ProcessRiskEvents())
+    if dedup is not None and dedup not in DEDUP_KEYS:
+        raise ValueError(
+            f"Unknown dedup key {dedup!r}; "
+            f"expected one of {sorted(DEDUP_KEYS)}"
         )
 
-        # Route events by event_type to separate tables
-        # Each table stores events with risk_level column for clustering
-        # Access events
-        _: PValue = (  # type: ignore[assignment]
-            processed_events
-            | 'FilterAccessEvents' >> beam.Filter(  # type: ignore[arg-type]
-                filter_access_events
-            )
-            | 'WriteAccessEvents' >> WriteToBigQuery(
-                table=f'{project_id}:{dataset_id}.access_events',
-                schema=event_schema,
-                write_disposition=BigQueryDisposition.WRITE_APPEND,
-                create_disposition=BigQueryDisposition.CREATE_IF_NEEDED
-            )
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(
+            f"Unknown input_format {input_format!r}; "
+            f"expected one of {INPUT_FORMATS}"
         )
 
-        # Data transfer events
-        _: PValue = (  # type: ignore[assignment]
-            processed_events
-            | 'FilterDataTransferEvents' >> beam.Filter(  # type: ignore
-                filter_data_transfer_events
-            )
-            | 'WriteDataTransferEvents' >> WriteToBigQuery(
-                table=f'{project_id}:{dataset_id}.data_transfer_events',
-                schema=event_schema,
-                write_disposition=BigQueryDisposition.WRITE_APPEND,
-                create_disposition=BigQueryDisposition.CREATE_IF_NEEDED
-            )
+    streaming = input_format == 'pubsub'
+    if streaming and runner in LOCAL_RUNNERS:
+        raise ValueError(
+            "input_format='pubsub' needs runner='dataflow'; replay a JSONL "
+            "file to run windowed aggregation locally"
+        )
+
+    pipeline_options = _pipeline_options(
+        project_id, output_path, runner, num_workers, region, streaming,
+        profile_location, profile_sample_rate
+    )
+    write_options = _write_options(
+        write_method, storage_api_streams, triggering_frequency,
+        load_batch_mb
+    )
+
+    pipeline = beam.Pipeline(options=pipeline_options)
+
+    # PCollection of processed risk events
+    # Reads from text files (JSON lines), straight from SQLite or Pub/Sub
+    if input_format == 'sqlite':
+        source = ReadRiskEventsFromSqlite(input_path)
+    elif input_format == 'parquet':
+        # Typed record batches are scored a column at a time
+        source = ReadRiskEventsFromParquet(input_path, record_batches=True)
+    elif input_format == 'pubsub':
+        source = ReadFromPubSub(
+            subscription=input_path, timestamp_attribute=timestamp_attribute
+        )
+    else:
+        source = ReadFromText(input_path)
+    processed_events: PCollection[Dict[str, Any]] = (  # type: ignore
+        pipeline
+        | 'ReadEvents' >> source
+        | 'ProcessEvents' >> beam.ParDo(
+            ProcessRiskEventsBatched(decoder, rules_path)
+            if input_format == 'parquet'
+            else ProcessRiskEvents(decoder, rules_path)
         )
+    )
 
-        # Privileged action events
-        _: PValue = (  # type: ignore[assignment]
+    # Drop replayed copies before they are scored or written anywhere
+    if dedup:
+        processed_events = (
             processed_events
-            | 'FilterPrivilegedEvents' >> beam.Filter(  # type: ignore
-                filter_privileged_events
-            )
-            | 'WritePrivilegedEvents' >> WriteToBigQuery(
-                table=f'{project_id}:{dataset_id}.privileged_action_events',
-                schema=event_schema,
-                write_disposition=BigQueryDisposition.WRITE_APPEND,
-                create_disposition=BigQueryDisposition.CREATE_IF_NEEDED
+            | 'DeduplicateEvents' >> DeduplicateEvents(
+                DEDUP_KEYS[dedup], streaming,
+                metrics_namespace=METRICS_NAMESPACE
             )
         )
 
-        # Authentication events
-        _: PValue = (  # type: ignore[assignment]
+    if baseline_path:
+        processed_events = (
             processed_events
-            | 'FilterAuthEvents' >> beam.Filter(  # type: ignore[arg-type]
-                filter_auth_events
+            | 'ScoreAnomalies' >> beam.ParDo(
+                ScoreRiskEventsWithML(baseline_path)
             )
-            | 'WriteAuthEvents' >> WriteToBigQuery(
-                table=f'{project_id}:{dataset_id}.authentication_events',
-                schema=event_schema,
-                write_disposition=BigQueryDisposition.WRITE_APPEND,
-                create_disposition=BigQueryDisposition.CREATE_IF_NEEDED
+        )
+
+    # All events in one table for the analytics queries, which filter
+    # on timestamp and so prune its daily partitions
+    _: PValue = (  # type: ignore[assignment]
+        processed_events
+        | 'WriteRiskEvents' >> _event_sink(
+            runner, project_id, dataset_id, RISK_EVENTS_TABLE,
+            event_schema, output_path, write_options
+        )
+    )
+
+    # Route events by event_type to separate tables in a single pass
+    # Each table is partitioned by day and clustered on risk_level,
+    # user_id (EVENT_TABLE_PARAMETERS)
+    routed = (
+        processed_events
+        | 'RouteEvents' >> beam.ParDo(  # type: ignore[arg-type]
+            RouteRiskEvents(rules_path)
+        ).with_outputs(*ROUTE_TAGS)
+    )
+
+    for tag, table, step_suffix in EVENT_TABLES:
+        _ = (
+            routed[tag]
+            | f'Write{step_suffix}' >> _event_sink(
+                runner, project_id, dataset_id, table,
+                event_schema, output_path, write_options
             )
         )
+        if archive_path:
+            _ = (
+                routed[tag]
+                | f'Archive{step_suffix}' >> WriteParquetArchive(
+                    os.path.join(archive_path, table, 'part'),
+                    f'{ARCHIVE_ID_COLUMN},{event_schema},'
+                    f'{ARCHIVE_FLAG_COLUMNS}'
+                )
+            )
+
+    lateness_option: Dict[str, int] = {}
+    if allowed_lateness is not None:
+        lateness_option['allowed_lateness'] = allowed_lateness
 
-        # Sensitive data access events
-        _: PValue = (  # type: ignore[assignment]
+    if window_size:
+        _ = (
             processed_events
-            | 'FilterSensitiveDataEvents' >> beam.Filter(  # type: ignore
-                filter_sensitive_data_events
+            | 'WindowUserRisk' >> WindowedUserRisk(
+                window_size, window_period, streaming,
+                **lateness_option
             )
-            | 'WriteSensitiveDataEvents' >> WriteToBigQuery(
-                table=(
-                    f'{project_id}:{dataset_id}.'
-                    'sensitive_data_access_events'
-                ),
-                schema=event_schema,
-                write_disposition=BigQueryDisposition.WRITE_APPEND,
-                create_disposition=BigQueryDisposition.CREATE_IF_NEEDED
+            | 'WriteUserRiskWindows' >> _event_sink(
+                runner, project_id, dataset_id, USER_RISK_WINDOWS_TABLE,
+                USER_RISK_WINDOW_SCHEMA, output_path, write_options,
+                USER_RISK_WINDOW_PARAMETERS
             )
         )
 
-        # All other events (catch-all)
-        _: PValue = (  # type: ignore[assignment]
+    if sketches:
+        _ = (
             processed_events
-            | 'FilterOtherEvents' >> beam.Filter(  # type: ignore[arg-type]
-                filter_other_events
-            )
-            | 'WriteOtherEvents' >> WriteToBigQuery(
-                table=f'{project_id}:{dataset_id}.other_events',
-                schema=event_schema,
-                write_disposition=BigQueryDisposition.WRITE_APPEND,
-                create_disposition=BigQueryDisposition.CREATE_IF_NEEDED
+            | 'DailyRiskSketches' >> DailyRiskSketches(**lateness_option)
+            | 'WriteRiskSketches' >> _event_sink(
+                runner, project_id, dataset_id, RISK_SKETCHES_TABLE,
+                RISK_SKETCH_SCHEMA, output_path, write_options,
+                RISK_SKETCH_PARAMETERS
             )
         )
 
+    result = pipeline.run()
+    result.wait_until_finish()
+    return result
+
 
 if __name__ == '__main__':
     import argparse
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('--project_id', required=True)
+    parser.add_argument(
+        '--project_id', default='',
+        help='GCP project (required for --runner dataflow)'
+    )
     parser.add_argument('--dataset_id', default='insider_risk')
     parser.add_argument('--input_path', required=True)
     parser.add_argument('--output_path', required=True)
+    parser.add_argument(
+        '--decoder', choices=DECODER_BACKENDS, default='auto',
+        help='JSON decoder backend (auto prefers msgspec, then orjson)'
+    )
+    parser.add_argument(
+        '--runner', choices=sorted(RUNNERS), default='dataflow',
+        help='direct/prism run locally and write JSONL to output_path'
+    )
+    parser.add_argument(
+        '--num_workers', type=int, default=os.cpu_count() or 1,
+        help='Worker processes for the local DirectRunner'
+    )
+    parser.add_argument('--region', default='europe-west2')
+    parser.add_argument(
+        '--input_format', choices=INPUT_FORMATS, default='jsonl',
+        help='jsonl may be gzip/bzip2/zstd compressed; parquet and sqlite '
+             'read typed risk_events columns; pubsub streams from the '
+             'subscription given as --input_path'
+    )
+    parser.add_argument(
+        '--baseline_path',
+        help='Directory of SimpleAnomalyDetector baselines; enables ML scoring'
+    )
+    parser.add_argument(
+        '--write_method', choices=sorted(WRITE_METHODS), default='default',
+        help='How rows are written to BigQuery'
+    )
+    parser.add_argument(
+        '--storage_api_streams', type=int, default=0,
+        help='Storage Write API streams per table (0 = Beam default)'
+    )
+    parser.add_argument(
+        '--triggering_frequency', type=int,
+        help='Seconds between Storage Write API commits (streaming)'
+    )
+    parser.add_argument(
+        '--load_batch_mb', type=int,
+        help='Max size of each file_loads load file, in MB'
+    )
+    parser.add_argument(
+        '--window_size', type=int,
+        help='Sliding window length in seconds; writes per-user aggregates '
+             'to user_risk_windows'
+    )
+    parser.add_argument(
+        '--window_period', type=int, default=60,
+        help='Seconds between sliding window starts'
+    )
+    parser.add_argument(
+        '--timestamp_attribute',
+        help='Pub/Sub message attribute with the event time (pubsub input)'
+    )
+    parser.add_argument(
+        '--allowed_lateness', type=int,
+        help='Seconds behind the watermark that events still update '
+             'windows and daily sketches'
+    )
+    parser.add_argument(
+        '--profile_location',
+        help='Directory for per-worker cProfile stats; enables profiling'
+    )
+    parser.add_argument(
+        '--profile_sample_rate', type=float, default=1.0,
+        help='Fraction of bundles to profile'
+    )
+    parser.add_argument(
+        '--dedup', choices=sorted(DEDUP_KEYS),
+        help='Drop duplicate events keyed on the source id or on '
+             'user_id, event_type and timestamp'
+    )
+    parser.add_argument(
+        '--sketches', action='store_true',
+        help='Write daily distinct-user and top-user sketches per risk '
+             'level to risk_sketches'
+    )
+    parser.add_argument(
+        '--archive_path',
+        help='Also write each routed table as Parquet under this path'
+    )
+    parser.add_argument(
+        '--rules_path',
+        help='JSON/YAML file of scoring weights, level thresholds and '
+             'routing keywords (default: built-in rules)'
+    )
 
     args = parser.parse_args()
+    if args.runner == 'dataflow' and not args.project_id:
+        parser.error('--project_id is required for --runner dataflow')
 
-    run_pipeline(
+    result = run_pipeline(
         args.project_id,
         args.dataset_id,
         args.input_path,
-        args.output_path
+        args.output_path,
+        decoder=args.decoder,
+        runner=args.runner,
+        num_workers=args.num_workers,
+        region=args.region,
+        input_format=args.input_format,
+        baseline_path=args.baseline_path,
+        write_method=args.write_method,
+        storage_api_streams=args.storage_api_streams,
+        triggering_frequency=args.triggering_frequency,
+        load_batch_mb=args.load_batch_mb,
+        window_size=args.window_size,
+        window_period=args.window_period,
+        profile_location=args.profile_location,
+        profile_sample_rate=args.profile_sample_rate,
+        dedup=args.dedup,
+        sketches=args.sketches,
+        archive_path=args.archive_path,
+        rules_path=args.rules_path,
+        timestamp_attribute=args.timestamp_attribute,
+        allowed_lateness=args.allowed_lateness
     )
+    for name, value in {
+        **pipeline_metrics(result), **sink_metrics(result)
+    }.items():
+        print(f"{name}: {value:,}" if isinstance(value, int)
+              else f"{name}: {value}")
@@ -0,0 +1,226 @@
+"""
+De-duplication of replayed or re-uploaded risk events.
+Events are keyed on their source id or on (user_id, event_type,
+timestamp). Exact duplicate checks use Beam keyed state, with a
+per-worker Bloom filter in front so events that were certainly not seen
+before can skip the state read in batch runs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+from typing import Any, Dict, Iterator, Sequence, Tuple
+
+import apache_beam as beam
+from apache_beam.coders import BooleanCoder
+from apache_beam.metrics import Metrics
+from apache_beam.transforms.timeutil import TimeDomain
+from apache_beam.transforms.userstate import (
+    ReadModifyWriteStateSpec, TimerSpec, on_timer
+)
+from apache_beam.utils.timestamp import Duration
+
+# Fields identifying an event for each --dedup mode
+DEDUP_KEYS: Dict[str, Tuple[str, ...]] = {
+    'id': ('id',),
+    'fields': ('user_id', 'event_type', 'timestamp'),
+}
+
+# Bloom filter sizing per worker: about 1.2 MB at these settings. Past
+# capacity the false positive rate rises, which only costs state reads
+DEFAULT_BLOOM_CAPACITY = 1_000_000
+DEFAULT_BLOOM_ERROR_RATE = 0.01
+
+# In streaming runs, a key's state is cleared this long (event time)
+# after it was first seen, so state doesn't grow without bound
+DEFAULT_STREAMING_TTL_SECONDS = 24 * 60 * 60
+
+# Separates key fields; not expected inside ids, users or timestamps
+_KEY_SEPARATOR = '\x1f'
+
+
+def event_key(event: Dict[str, Any], fields: Sequence[str]) -> str:
+    """
+    Dedup key of an event from the given fields. Keying on ('id',) falls
+    back to the (user_id, event_type, timestamp) fields for events
+    without an id.
+    """
+    if tuple(fields) == DEDUP_KEYS['id']:
+        if event.get('id') is not None:
+            return str(event['id'])
+        fields = DEDUP_KEYS['fields']
+    return _KEY_SEPARATOR.join(str(event.get(field)) for field in fields)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings, sized for capacity entries at
+    error_rate false positives. Bit positions come from double hashing
+    one 128-bit BLAKE2b digest per key.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_BLOOM_CAPACITY,
+        error_rate: float = DEFAULT_BLOOM_ERROR_RATE
+    ) -> None:
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError(
+                'capacity must be positive and error_rate in (0, 1)'
+            )
+        self.num_bits = max(8, math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        ))
+        self.num_hashes = max(1, round(
+            self.num_bits / capacity * math.log(2)
+        ))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(
+            bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key)
+        )
+
+    def add(self, key: str) -> bool:
+        """Add key; return True if it was possibly present already."""
+        bits = self._bits
+        present = True
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                present = False
+                bits[pos >> 3] |= mask
+        return present
+
+
+class _DropDuplicates(beam.DoFn):
+    """
+    Emit the first event per key and drop the rest, counting them as
+    duplicates_dropped.
+
+    The seen flag lives in keyed state. A Bloom filter negative proves
+    this worker never saw the key, and in batch runs every element of a
+    key is processed by the same worker, so the state read is skipped
+    (trust_bloom_negatives). Streaming runners can move keys between
+    workers, so there a negative is only a hint and state is always read.
+    A positive (seen, or a false positive) always checks state.
+    """
+
+    SEEN_STATE = ReadModifyWriteStateSpec('seen', BooleanCoder())
+    EXPIRY_TIMER = TimerSpec('expiry', TimeDomain.WATERMARK)
+
+    def __init__(
+        self,
+        trust_bloom_negatives: bool,
+        ttl_seconds: int | None,
+        bloom_capacity: int,
+        bloom_error_rate: float,
+        metrics_namespace: str
+    ) -> None:
+        self._trust_bloom_negatives = trust_bloom_negatives
+        self._ttl_seconds = ttl_seconds
+        self._bloom_capacity = bloom_capacity
+        self._bloom_error_rate = bloom_error_rate
+        self._bloom: BloomFilter | None = None
+        self._dropped = Metrics.counter(
+            metrics_namespace, 'duplicates_dropped'
+        )
+        self._state_reads = Metrics.counter(
+            metrics_namespace, 'dedup_state_reads'
+        )
+        self._bundle_dropped = 0
+        self._bundle_reads = 0
+
+    def setup(self) -> None:
+        # One filter per DoFn instance, kept for the worker's lifetime
+        self._bloom = BloomFilter(self._bloom_capacity, self._bloom_error_rate)
+
+    def finish_bundle(self) -> None:
+        if self._bundle_dropped:
+            self._dropped.inc(self._bundle_dropped)
+        if self._bundle_reads:
+            self._state_reads.inc(self._bundle_reads)
+        self._bundle_dropped = 0
+        self._bundle_reads = 0
+
+    def process(
+        self,
+        element: Tuple[str, Dict[str, Any]],
+        timestamp: Any = beam.DoFn.TimestampParam,
+        seen: Any = beam.DoFn.StateParam(SEEN_STATE),
+        expiry: Any = beam.DoFn.TimerParam(EXPIRY_TIMER)
+    ) -> Iterator[Dict[str, Any]]:
+        if self._bloom is None:
+            self.setup()
+        key, event = element
+        maybe_seen = self._bloom.add(key)  # type: ignore[union-attr]
+        if maybe_seen or not self._trust_bloom_negatives:
+            self._bundle_reads += 1
+            if seen.read():
+                self._bundle_dropped += 1
+                return
+        seen.write(True)
+        if self._ttl_seconds:
+            expiry.set(timestamp + Duration(seconds=self._ttl_seconds))
+        yield event
+
+    @on_timer(EXPIRY_TIMER)
+    def expire(self, seen: Any = beam.DoFn.StateParam(SEEN_STATE)) -> None:
+        seen.clear()
+
+
+def _keyed(
+    event: Dict[str, Any], fields: Sequence[str]
+) -> Tuple[str, Dict[str, Any]]:
+    return event_key(event, fields), event
+
+
+class DeduplicateEvents(beam.PTransform):
+    """
+    Drop repeated events, keyed on key_fields (see DEDUP_KEYS). With
+    streaming=True, state is always read and each key's state expires
+    ttl_seconds of event time after it was first seen
+    (DEFAULT_STREAMING_TTL_SECONDS unless given); batch runs keep it for
+    the whole run and skip state reads on Bloom filter negatives.
+    """
+
+    def __init__(
+        self,
+        key_fields: Sequence[str] = DEDUP_KEYS['fields'],
+        streaming: bool = False,
+        ttl_seconds: int | None = None,
+        bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+        bloom_error_rate: float = DEFAULT_BLOOM_ERROR_RATE,
+        metrics_namespace: str = 'dedup'
+    ) -> None:
+        super().__init__()
+        self._key_fields = tuple(key_fields)
+        self._streaming = streaming
+        if streaming and ttl_seconds is None:
+            ttl_seconds = DEFAULT_STREAMING_TTL_SECONDS
+        self._ttl_seconds = ttl_seconds
+        self._bloom_capacity = bloom_capacity
+        self._bloom_error_rate = bloom_error_rate
+        self._metrics_namespace = metrics_namespace
+
+    def expand(self, events: Any) -> Any:
+        return (
+            events
+            | 'KeyEvents' >> beam.Map(
+                _keyed, self._key_fields
+            ).with_output_types(Tuple[str, Dict[str, Any]])
+            | 'DropDuplicates' >> beam.ParDo(_DropDuplicates(
+                not self._streaming, self._ttl_seconds,
+                self._bloom_capacity, self._bloom_error_rate,
+                self._metrics_namespace
+            ))
+        )
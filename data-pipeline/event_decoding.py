@@ -0,0 +1,272 @@
+"""
+Fast decoding of JSON-lines risk events into compact typed records.
+Uses msgspec or orjson when installed and falls back to stdlib json.
+msgspec decodes each line straight into a Struct when it has only known
+keys; otherwise, and with the other backends, the decoded dict is copied
+into a RiskEvent.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, FrozenSet, Mapping, Optional, Tuple
+
+from ml_anomaly_detection import FEATURE_DEFAULTS
+
+# Boolean risk flags stored as INTEGER 0/1 in SQLite
+RISK_FLAG_FIELDS: Tuple[str, ...] = (
+    'sensitive_data_access',
+    'unusual_time',
+    'large_data_transfer',
+    'privileged_action',
+)
+
+# Columns of the risk_events table (see databases/init_databases.sql)
+RISK_EVENT_FIELDS: Tuple[str, ...] = (
+    'id',
+    'user_id',
+    'event_type',
+    'timestamp',
+    'risk_score',
+    'risk_level',
+) + RISK_FLAG_FIELDS + (
+    'created_at',
+)
+
+_KNOWN_FIELDS: FrozenSet[str] = frozenset(RISK_EVENT_FIELDS)
+
+DECODER_BACKENDS: Tuple[str, ...] = ('auto', 'msgspec', 'orjson', 'json')
+
+
+def normalize_flag(value: Any) -> Any:
+    """Convert SQLite 0/1 or 'true'/'yes' strings to bool."""
+    if value is None or value is True or value is False:
+        return value
+    if isinstance(value, int):
+        return bool(value)
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return value
+
+
+class RiskEvent:
+    """
+    Typed risk_events row with one slot per column.
+    Keys outside the risk_events schema are kept in ``extra``.
+    """
+
+    __slots__ = RISK_EVENT_FIELDS + ('extra',)
+
+    id: Optional[int]
+    user_id: Optional[str]
+    event_type: Optional[str]
+    timestamp: Optional[str]
+    risk_score: Optional[float]
+    risk_level: Optional[str]
+    sensitive_data_access: Any
+    unusual_time: Any
+    large_data_transfer: Any
+    privileged_action: Any
+    created_at: Optional[str]
+    extra: Optional[Dict[str, Any]]
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[str, Any]) -> RiskEvent:
+        """Build a normalized record from a decoded JSON object or row."""
+        event = cls.__new__(cls)
+        get = data.get
+        event.id = get('id')
+        event.user_id = get('user_id')
+        event_type = get('event_type')
+        # Normalize event_type to lowercase for filtering
+        event.event_type = (
+            None if event_type is None else str(event_type).lower()
+        )
+        event.timestamp = get('timestamp')
+        event.risk_score = get('risk_score')
+        event.risk_level = get('risk_level')
+        event.sensitive_data_access = normalize_flag(
+            get('sensitive_data_access')
+        )
+        event.unusual_time = normalize_flag(get('unusual_time'))
+        event.large_data_transfer = normalize_flag(get('large_data_transfer'))
+        event.privileged_action = normalize_flag(get('privileged_action'))
+        event.created_at = get('created_at')
+        # Set comparison on the key view avoids building a dict per row
+        event.extra = (
+            None if data.keys() <= _KNOWN_FIELDS
+            else {k: v for k, v in data.items() if k not in _KNOWN_FIELDS}
+        )
+        return event
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dict-style access; unset fields return the default."""
+        if key in _KNOWN_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Return a row dict (e.g. for WriteToBigQuery). Columns that are
+        unset (absent or null) are left out.
+        """
+        row = {
+            'id': self.id,
+            'user_id': self.user_id,
+            'event_type': self.event_type,
+            'timestamp': self.timestamp,
+            'risk_score': self.risk_score,
+            'risk_level': self.risk_level,
+            'sensitive_data_access': self.sensitive_data_access,
+            'unusual_time': self.unusual_time,
+            'large_data_transfer': self.large_data_transfer,
+            'privileged_action': self.privileged_action,
+            'created_at': self.created_at,
+        }
+        # A dict literal plus a few deletes beats getattr per column
+        for name in [name for name, value in row.items() if value is None]:
+            del row[name]
+        if self.extra:
+            row.update(self.extra)
+        return row
+
+    def __repr__(self) -> str:
+        return f'RiskEvent({self.to_dict()!r})'
+
+
+# Columns of the msgspec Struct: the risk_events columns and the anomaly
+# detector features, as read from Parquet input. Lines with other keys
+# are decoded through RiskEvent.from_mapping instead.
+MSGSPEC_FIELDS: Tuple[str, ...] = RISK_EVENT_FIELDS + tuple(FEATURE_DEFAULTS)
+
+_msgspec_event_type: Optional[type] = None
+
+
+def _msgspec_risk_event() -> type:
+    """
+    msgspec Struct type with RiskEvent's attributes, get() and to_dict(),
+    defined on first use so msgspec stays optional. Columns accept any
+    JSON type and are normalized as in RiskEvent.from_mapping; keys
+    outside MSGSPEC_FIELDS raise ValidationError (see get_decoder).
+    """
+    global _msgspec_event_type
+    if _msgspec_event_type is not None:
+        return _msgspec_event_type
+
+    import msgspec  # type: ignore[import-not-found]
+
+    to_builtins = msgspec.to_builtins
+    unset = msgspec.UNSET
+
+    # omit_defaults: to_builtins() leaves out risk_events columns that are
+    # None and feature columns absent from the line; a null feature is
+    # kept, as RiskEvent keeps it in extra
+    class MsgspecRiskEvent(
+        msgspec.Struct, omit_defaults=True, forbid_unknown_fields=True
+    ):
+        id: Any = None
+        user_id: Any = None
+        event_type: Any = None
+        timestamp: Any = None
+        risk_score: Any = None
+        risk_level: Any = None
+        sensitive_data_access: Any = None
+        unusual_time: Any = None
+        large_data_transfer: Any = None
+        privileged_action: Any = None
+        created_at: Any = None
+        file_access_count: Any = unset
+        data_transfer_size_mb: Any = unset
+        hour_of_day: Any = unset
+
+        def __post_init__(self) -> None:
+            # Same normalization as RiskEvent.from_mapping
+            if self.event_type is not None:
+                self.event_type = str(self.event_type).lower()
+            self.sensitive_data_access = normalize_flag(
+                self.sensitive_data_access
+            )
+            self.unusual_time = normalize_flag(self.unusual_time)
+            self.large_data_transfer = normalize_flag(
+                self.large_data_transfer
+            )
+            self.privileged_action = normalize_flag(self.privileged_action)
+
+        def get(self, key: str, default: Any = None) -> Any:
+            """Dict-style access; unset fields return the default."""
+            value = getattr(self, key, unset)
+            if value is unset or (value is None and key in _KNOWN_FIELDS):
+                return default
+            return value
+
+        def to_dict(self) -> Dict[str, Any]:
+            """Row dict without unset columns, as RiskEvent.to_dict."""
+            return to_builtins(self)
+
+    _msgspec_event_type = MsgspecRiskEvent
+    return MsgspecRiskEvent
+
+
+def _load_json_backend(backend: str) -> Callable[[Any], Any]:
+    """Return the raw JSON loads function for a backend."""
+    if backend == 'msgspec':
+        import msgspec  # type: ignore[import-not-found]
+        return msgspec.json.Decoder().decode
+    if backend == 'orjson':
+        import orjson  # type: ignore[import-not-found]
+        return orjson.loads
+    if backend == 'json':
+        return json.loads
+    raise ValueError(
+        f"Unknown decoder backend {backend!r}; "
+        f"expected one of {DECODER_BACKENDS}"
+    )
+
+
+def resolve_backend(backend: str = 'auto') -> str:
+    """Pick the fastest installed backend for 'auto'."""
+    if backend != 'auto':
+        return backend
+    for candidate in ('msgspec', 'orjson'):
+        try:
+            _load_json_backend(candidate)
+        except ImportError:
+            continue
+        return candidate
+    return 'json'
+
+
+def get_decoder(
+    backend: str = 'auto'
+) -> Callable[[str | bytes], RiskEvent]:
+    """
+    Return a function decoding one JSON line into a RiskEvent.
+    'auto' prefers msgspec, then orjson, then stdlib json. msgspec
+    returns a Struct with the same interface (see _msgspec_risk_event)
+    for lines with only MSGSPEC_FIELDS keys; every backend gives the
+    same to_dict() for the same line.
+    """
+    backend = resolve_backend(backend)
+    loads = _load_json_backend(backend)
+    from_mapping = RiskEvent.from_mapping
+    if backend == 'msgspec':
+        import msgspec  # type: ignore[import-not-found]
+        decode_struct = msgspec.json.Decoder(_msgspec_risk_event()).decode
+        validation_error = msgspec.ValidationError
+
+        def decode_msgspec(line: str | bytes) -> RiskEvent:
+            try:
+                return decode_struct(line)
+            except validation_error:
+                # Extra keys (or a non-object line): decode as a dict
+                return from_mapping(loads(line))
+
+        return decode_msgspec
+
+    def decode(line: str | bytes) -> RiskEvent:
+        return from_mapping(loads(line))
+
+    return decode
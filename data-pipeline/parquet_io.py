@@ -0,0 +1,179 @@
+"""
+Parquet input and archive output for the pipeline.
+risk_events are read as Arrow record batches with only the columns the
+pipeline uses, and routed event tables can be archived as zstd Parquet
+files with typed columns.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import apache_beam as beam
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.io.parquetio import (
+    ReadFromParquetBatched,
+    WriteToParquetBatched,
+)
+
+from event_decoding import RISK_EVENT_FIELDS
+from ml_anomaly_detection import FEATURE_DEFAULTS
+
+# Columns ProcessRiskEvents and the anomaly detector read; anything else
+# in the files is never decoded
+PARQUET_INPUT_COLUMNS = RISK_EVENT_FIELDS + tuple(FEATURE_DEFAULTS)
+
+# Rows per archive row group
+DEFAULT_ARCHIVE_BATCH_ROWS = 100_000
+
+# Arrow types for BigQuery schema types; timestamps are UTC
+_ARROW_TYPES = {
+    'STRING': pa.string(),
+    'INTEGER': pa.int64(),
+    'FLOAT': pa.float64(),
+    'BOOLEAN': pa.bool_(),
+    'TIMESTAMP': pa.timestamp('us', tz='UTC'),
+    'DATE': pa.date32(),
+    'BYTES': pa.binary(),
+}
+
+# Text form of timestamps read from Parquet, as stored in SQLite
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parquet_columns(
+    file_pattern: str, wanted: Sequence[str] = PARQUET_INPUT_COLUMNS
+) -> List[str]:
+    """
+    The wanted columns present in the first file matching file_pattern,
+    so the read projects onto them without failing on absent ones.
+    """
+    matches = FileSystems.match([file_pattern])[0].metadata_list
+    if not matches:
+        raise ValueError(f'No Parquet files match {file_pattern!r}')
+    with FileSystems.open(matches[0].path) as f:
+        names = set(pq.ParquetFile(f).schema_arrow.names)
+    return [name for name in wanted if name in names]
+
+
+def format_timestamps(table: pa.Table) -> pa.Table:
+    """
+    The table with timestamp columns formatted as 'YYYY-MM-DD HH:MM:SS'
+    text, like the other sources.
+    """
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            # Whole seconds, or %S would print the sub-second fraction
+            seconds = table.column(i).cast(
+                pa.timestamp('s', tz=field.type.tz), safe=False
+            )
+            table = table.set_column(
+                i, field.name, pc.strftime(seconds, format=_TIMESTAMP_FORMAT)
+            )
+    return table
+
+
+def record_batch_rows(table: pa.Table) -> Iterator[Dict[str, Any]]:
+    """Row dicts of an Arrow table for ProcessRiskEvents."""
+    yield from format_timestamps(table).to_pylist()
+
+
+class ReadRiskEventsFromParquet(beam.PTransform):
+    """
+    Read risk_events rows from Parquet files as dicts. Only columns
+    (default: PARQUET_INPUT_COLUMNS present in the first file) are read,
+    one row group at a time. With record_batches=True the Arrow tables
+    are emitted as they are read (timestamps formatted), for
+    ProcessRiskEventsBatched.
+    """
+
+    def __init__(
+        self,
+        file_pattern: str,
+        columns: Optional[Sequence[str]] = None,
+        record_batches: bool = False
+    ) -> None:
+        super().__init__()
+        self._file_pattern = file_pattern
+        self._columns = columns
+        self._record_batches = record_batches
+
+    def expand(self, pbegin: Any) -> Any:
+        columns = self._columns
+        if columns is None:
+            columns = parquet_columns(self._file_pattern)
+        batches = (
+            pbegin
+            | 'ReadRecordBatches' >> ReadFromParquetBatched(
+                self._file_pattern, columns=list(columns)
+            )
+        )
+        if self._record_batches:
+            return batches | 'FormatTimestamps' >> beam.Map(format_timestamps)
+        return batches | 'ToRows' >> beam.FlatMap(record_batch_rows)
+
+
+def arrow_schema(bigquery_schema: str) -> pa.Schema:
+    """Arrow schema for a 'name:TYPE,...' BigQuery schema string."""
+    fields = []
+    for column in bigquery_schema.split(','):
+        name, type_ = column.split(':')
+        fields.append(pa.field(name, _ARROW_TYPES[type_]))
+    return pa.schema(fields)
+
+
+def _timestamp_array(values: List[Any]) -> pa.Array:
+    """UTC timestamps from text (naive = UTC, as in risk_windows)."""
+    text = pa.array(values, pa.string())
+    try:
+        return pc.assume_timezone(text.cast(pa.timestamp('us')), 'UTC')
+    except pa.ArrowInvalid:  # Text with zone offsets
+        return text.cast(pa.timestamp('us', tz='UTC'))
+
+
+def rows_to_table(rows: List[Dict[str, Any]], schema: pa.Schema) -> pa.Table:
+    """Arrow table of rows, keeping only (and all of) schema's columns."""
+    columns = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_timestamp(field.type):
+            columns.append(_timestamp_array(values))
+        else:
+            columns.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class WriteParquetArchive(beam.PTransform):
+    """
+    Write rows as zstd-compressed Parquet files path_prefix-*.parquet
+    with the columns and types of a BigQuery schema string, in row
+    groups of up to batch_rows rows.
+    """
+
+    def __init__(
+        self,
+        path_prefix: str,
+        bigquery_schema: str,
+        batch_rows: int = DEFAULT_ARCHIVE_BATCH_ROWS
+    ) -> None:
+        super().__init__()
+        self._path_prefix = path_prefix
+        self._schema = arrow_schema(bigquery_schema)
+        self._batch_rows = batch_rows
+
+    def expand(self, rows: Any) -> Any:
+        return (
+            rows
+            | 'Batch' >> beam.BatchElements(
+                min_batch_size=min(1000, self._batch_rows),
+                max_batch_size=self._batch_rows,
+            )
+            | 'ToArrow' >> beam.Map(rows_to_table, self._schema)
+            | 'WriteParquet' >> WriteToParquetBatched(
+                self._path_prefix, self._schema, codec='zstd',
+                file_name_suffix='.parquet'
+            )
+        )
@@ -0,0 +1,139 @@
+"""
+In-process result cache for analytics queries.
+Entries expire after a TTL and are evicted least-recently-used once the
+entry or byte budget is exceeded. Concurrent identical queries are
+coalesced so they share a single job.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so formatting changes don't miss the cache."""
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+def make_cache_key(
+    query: str, params: Optional[Dict[str, Any]] = None
+) -> Tuple[str, Tuple[Tuple[str, Any], ...]]:
+    """Cache key from the normalized query text and sorted parameters."""
+    return normalize_query(query), tuple(sorted((params or {}).items()))
+
+
+def estimate_size(result: Any) -> int:
+    """Approximate bytes held by a result (DataFrame or other object)."""
+    memory_usage = getattr(result, 'memory_usage', None)
+    if memory_usage is not None:
+        return int(memory_usage(index=True, deep=True).sum())
+    return sys.getsizeof(result)
+
+
+class QueryCache:
+    """
+    Thread-safe result cache with TTL expiry, LRU eviction bounded by
+    entry count and approximate bytes, and request coalescing.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires_at, size, result), least recently used first
+        self._entries: OrderedDict[Hashable, Tuple[float, int, Any]] = (
+            OrderedDict()
+        )
+        # key -> Future of the query currently computing it
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for key, or run compute() and cache it.
+        Callers arriving while compute() is running wait for its result
+        instead of starting their own.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                self._remove(key)
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._store(key, result)
+        future.set_result(result)
+        return result
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one entry, or every entry when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._remove(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: Hashable, result: Any) -> None:
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return  # Would evict everything else; serve it uncached
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.monotonic() + self.ttl_seconds
+        self._entries[key] = (expires_at, size, result)
+        self._bytes += size
+        while (
+            len(self._entries) > self.max_entries
+            or self._bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,264 @@
+"""
+Configurable risk scoring and routing rules.
+Weights, level thresholds and routing keywords are read from a JSON (or,
+with PyYAML installed, YAML) rules file and compiled once per worker:
+flag weights into a 16-entry score table indexed by the 4-bit flag
+combination, and all routing keywords into one regex whose results are
+cached per event_type. RulesWatcher picks up edits to the file without
+a redeploy.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple
+
+import numpy as np
+from apache_beam.io.filesystems import FileSystems
+
+from event_decoding import RISK_FLAG_FIELDS, RiskEvent
+
+logger = logging.getLogger(__name__)
+
+# Tag of the sensitive data access table
+SENSITIVE_TAG = 'sensitive_data'
+
+# Catch-all tag for events matching no excluded keyword or flag route
+OTHER_TAG = 'other'
+
+# Rules used without a rules file; a file overrides these top-level keys
+DEFAULT_RULES: Dict[str, Any] = {
+    # Score each flag contributes when set; the sum is capped at max_score
+    'flag_weights': {
+        'sensitive_data_access': 30,
+        'unusual_time': 20,
+        'large_data_transfer': 40,
+        'privileged_action': 25,
+    },
+    'max_score': 100,
+    # Lowest score of each level above LOW
+    'level_thresholds': {'MEDIUM': 40, 'HIGH': 70},
+    # Output tag -> event_type keywords (substrings) routing events there.
+    # A single event may match several tags (e.g. 'sensitive_file_export')
+    'routes': {
+        'access': ['access', 'file'],
+        'data_transfer': ['transfer', 'download', 'export'],
+        'privileged': ['privileged', 'admin'],
+        'authentication': ['authentication', 'login'],
+        SENSITIVE_TAG: ['sensitive'],
+    },
+    # Flag -> tag receiving every event with that flag set; such events
+    # never go to the catch-all table
+    'flag_routes': {'sensitive_data_access': SENSITIVE_TAG},
+    # Keywords keeping an event out of the catch-all table. 'file' and
+    # 'sensitive' are deliberately absent
+    'other_excluded_keywords': [
+        'access', 'transfer', 'download', 'export',
+        'privileged', 'admin', 'authentication', 'login',
+    ],
+}
+
+RISK_LEVELS = np.array(['LOW', 'MEDIUM', 'HIGH'], dtype=object)
+
+# Output tags a rules file may route to (each has its own table)
+ROUTE_TAGS: Tuple[str, ...] = tuple(DEFAULT_RULES['routes']) + (OTHER_TAG,)
+
+# How often RulesWatcher looks at the rules file's modification time
+DEFAULT_CHECK_INTERVAL_SECONDS = 30
+
+# Distinct (event_type, flags) routing results kept before the cache is
+# cleared; event types are few, so this is rarely reached
+_ROUTE_CACHE_SIZE = 4096
+
+# Bit of each RISK_FLAG_FIELDS flag in a flag mask
+FLAG_BITS = 1 << np.arange(len(RISK_FLAG_FIELDS))
+
+
+class RiskRules:
+    """
+    Compiled rules. score_lut[mask] is the score of the flag combination
+    mask (bit i set = RISK_FLAG_FIELDS[i] set), so scoring an event or a
+    batch is a table lookup. Invalid rules raise ValueError.
+    """
+
+    def __init__(self, rules: Mapping[str, Any] = DEFAULT_RULES) -> None:
+        config = {**DEFAULT_RULES, **rules}
+
+        weights = config['flag_weights']
+        unknown = set(weights) - set(RISK_FLAG_FIELDS)
+        if unknown:
+            raise ValueError(
+                f"Unknown flags in flag_weights: {sorted(unknown)}"
+            )
+        weight_vector = np.array(
+            [weights.get(flag, 0) for flag in RISK_FLAG_FIELDS],
+            dtype=np.int64,
+        )
+        masks = np.arange(1 << len(RISK_FLAG_FIELDS))
+        bits = (masks[:, None] & FLAG_BITS) != 0
+        self.score_lut = np.minimum(
+            bits @ weight_vector, int(config['max_score'])
+        )
+
+        thresholds = config['level_thresholds']
+        if set(thresholds) != {'MEDIUM', 'HIGH'}:
+            raise ValueError('level_thresholds needs exactly MEDIUM and HIGH')
+        self._medium = thresholds['MEDIUM']
+        self._high = thresholds['HIGH']
+        if self._medium > self._high:
+            raise ValueError('MEDIUM threshold must not exceed HIGH')
+        self.level_thresholds = np.array([self._medium, self._high])
+        self._scores = self.score_lut.tolist()
+        self._levels = self.levels(self.score_lut).tolist()
+
+        routes = config['routes']
+        flag_routes = config['flag_routes']
+        unknown = set(flag_routes) - set(RISK_FLAG_FIELDS)
+        if unknown:
+            raise ValueError(
+                f"Unknown flags in flag_routes: {sorted(unknown)}"
+            )
+        unknown = (set(routes) | set(flag_routes.values())) - set(ROUTE_TAGS)
+        if unknown:
+            raise ValueError(
+                f"Unknown route tags {sorted(unknown)}; "
+                f"expected some of {ROUTE_TAGS}"
+            )
+        self._routes: Tuple[Tuple[str, FrozenSet[str]], ...] = tuple(
+            (tag, frozenset(map(str.lower, words)))
+            for tag, words in routes.items()
+        )
+        self._flag_routes: Tuple[Tuple[str, str], ...] = tuple(
+            flag_routes.items()
+        )
+        self._other_excluded = frozenset(
+            map(str.lower, config['other_excluded_keywords'])
+        )
+        keywords = sorted(
+            set().union(*(words for _, words in self._routes))
+            | self._other_excluded
+        )
+        # Zero-width lookahead so overlapping keywords are all reported
+        self._pattern = re.compile(
+            '(?=(' + '|'.join(map(re.escape, keywords)) + '))'
+            if keywords else '(?!)'
+        )
+        self._route_cache: Dict[Tuple[Any, int], Tuple[str, ...]] = {}
+
+    def level(self, score: float) -> str:
+        if score >= self._high:
+            return 'HIGH'
+        if score >= self._medium:
+            return 'MEDIUM'
+        return 'LOW'
+
+    def score_and_level(self, event: RiskEvent) -> Tuple[int, str]:
+        """Score and level of an event's flags, from the lookup tables."""
+        mask = (
+            bool(event.sensitive_data_access)
+            | bool(event.unusual_time) << 1
+            | bool(event.large_data_transfer) << 2
+            | bool(event.privileged_action) << 3
+        )
+        return self._scores[mask], self._levels[mask]
+
+    def scores(self, flags: np.ndarray) -> np.ndarray:
+        """Scores of an (n, 4) boolean flag matrix (RISK_FLAG_FIELDS order)."""
+        return self.score_lut[flags @ FLAG_BITS]
+
+    def levels(self, scores: np.ndarray) -> np.ndarray:
+        """Risk level names for an array of scores."""
+        return RISK_LEVELS[np.digitize(scores, self.level_thresholds)]
+
+    def routes(self, event: Mapping[str, Any]) -> Tuple[str, ...]:
+        """Output tags of an event row, in ROUTE_TAGS order."""
+        event_type = event.get('event_type', '')
+        flagged = 0
+        for bit, (flag, _) in enumerate(self._flag_routes):
+            if event.get(flag, False):
+                flagged |= 1 << bit
+        key = (event_type, flagged)
+        tags = self._route_cache.get(key)
+        if tags is None:
+            tags = self._match(str(event_type).lower(), flagged)
+            if len(self._route_cache) >= _ROUTE_CACHE_SIZE:
+                self._route_cache.clear()
+            self._route_cache[key] = tags
+        return tags
+
+    def _match(self, event_type: str, flagged: int) -> Tuple[str, ...]:
+        matched = set(self._pattern.findall(event_type))
+        tags = {
+            tag for tag, keywords in self._routes
+            if not matched.isdisjoint(keywords)
+        }
+        tags.update(
+            tag for bit, (_, tag) in enumerate(self._flag_routes)
+            if flagged & (1 << bit)
+        )
+        if not flagged and matched.isdisjoint(self._other_excluded):
+            tags.add(OTHER_TAG)
+        return tuple(tag for tag in ROUTE_TAGS if tag in tags)
+
+
+DEFAULT_RISK_RULES = RiskRules(DEFAULT_RULES)
+
+
+def load_rules(path: str) -> RiskRules:
+    """
+    Compile a rules file: YAML for .yaml/.yml paths (needs PyYAML),
+    JSON otherwise. Keys missing from the file keep DEFAULT_RULES.
+    """
+    with FileSystems.open(path) as f:
+        text = f.read().decode('utf-8')
+    if path.endswith(('.yaml', '.yml')):
+        import yaml  # type: ignore[import-untyped]
+        rules = yaml.safe_load(text)
+    else:
+        rules = json.loads(text)
+    if not isinstance(rules, dict):
+        raise ValueError(f"Rules file {path} must contain a mapping")
+    return RiskRules(rules)
+
+
+def _modified_time(path: str) -> float:
+    metadata = FileSystems.match([path])[0].metadata_list[0]
+    return metadata.last_updated_in_seconds
+
+
+class RulesWatcher:
+    """
+    Current rules of a rules file. poll() looks at the file's
+    modification time at most every check_interval_seconds and recompiles
+    it when it changed; a file that fails to load is logged and the
+    previous rules stay in force. Call poll() per bundle, not per event.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        check_interval_seconds: float = DEFAULT_CHECK_INTERVAL_SECONDS
+    ) -> None:
+        self.path = path
+        self._check_interval = check_interval_seconds
+        self._modified: Optional[float] = _modified_time(path)
+        self.rules = load_rules(path)
+        self._next_check = time.monotonic() + check_interval_seconds
+
+    def poll(self) -> RiskRules:
+        now = time.monotonic()
+        if now < self._next_check:
+            return self.rules
+        self._next_check = now + self._check_interval
+        try:
+            modified = _modified_time(self.path)
+            if modified != self._modified:
+                self.rules = load_rules(self.path)
+                self._modified = modified
+                logger.info(f"Reloaded risk rules from {self.path}")
+        except Exception as e:
+            logger.error(f"Error reloading risk rules from {self.path}: {e}")
+        return self.rules
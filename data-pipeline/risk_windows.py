@@ -0,0 +1,191 @@
+"""
+Sliding-window per-user risk aggregates for the streaming pipeline.
+Events are timestamped from their own timestamp field, so windows follow
+event time whether the input is Pub/Sub or a replayed JSONL file.
+Events behind the watermark are kept for ALLOWED_LATENESS_SECONDS; rows
+carry their pane so repeated firings of a window can be told apart.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Tuple
+
+import apache_beam as beam
+from apache_beam.transforms import trigger, window
+from apache_beam.utils.windowed_value import PaneInfoTiming
+
+logger = logging.getLogger(__name__)
+
+# BigQuery schema of the user_risk_windows table
+USER_RISK_WINDOW_SCHEMA = (
+    'user_id:STRING,window_start:TIMESTAMP,window_end:TIMESTAMP,'
+    'event_count:INTEGER,max_risk_score:FLOAT,avg_risk_score:FLOAT,'
+    'high_risk_events:INTEGER,pane_index:INTEGER,pane_timing:STRING'
+)
+
+# Daily partitions on the window end, clustered by user
+USER_RISK_WINDOW_PARAMETERS: Dict[str, Any] = {
+    'timePartitioning': {'type': 'DAY', 'field': 'window_end'},
+    'clustering': {'fields': ['user_id']},
+}
+
+# In streaming runs, emit partial aggregates this often (processing time)
+# before the watermark closes a window, so alerts don't wait for it
+EARLY_FIRING_SECONDS = 10
+
+# Events re-stamped to their own time can be behind the watermark (which
+# follows Pub/Sub publish time unless the subscription is read with a
+# timestamp attribute). They still update windows this long after the
+# watermark passes them; later ones are dropped
+ALLOWED_LATENESS_SECONDS = 60 * 60
+
+# (event_count, risk_score_sum, max_risk_score, high_risk_events)
+Accumulator = Tuple[int, float, float, int]
+
+
+def event_time(value: Any) -> float:
+    """
+    Unix seconds of an event timestamp: 'YYYY-MM-DD HH:MM:SS' as stored
+    in SQLite, ISO 8601 or epoch seconds. Naive times are taken as UTC.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class AddEventTimestamps(beam.DoFn):
+    """Assign each event its own timestamp as the element's event time."""
+
+    def process(
+        self, event: Dict[str, Any]
+    ) -> Iterator[window.TimestampedValue]:
+        try:
+            yield window.TimestampedValue(
+                event, event_time(event['timestamp'])
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Error reading event timestamp: {e}")
+
+
+class UserRiskCombineFn(beam.CombineFn):
+    """
+    Combine (risk_score, is_high) pairs into count, sum, max and HIGH
+    count. Accumulators are small tuples that merge associatively, so
+    runners can lift the combine ahead of the shuffle.
+    """
+
+    def create_accumulator(self) -> Accumulator:
+        return 0, 0.0, float('-inf'), 0
+
+    def add_input(
+        self, accumulator: Accumulator, element: Tuple[float, bool]
+    ) -> Accumulator:
+        count, total, highest, high = accumulator
+        score, is_high = element
+        return count + 1, total + score, max(highest, score), high + is_high
+
+    def merge_accumulators(self, accumulators: Any) -> Accumulator:
+        count, total, highest, high = self.create_accumulator()
+        for a_count, a_total, a_highest, a_high in accumulators:
+            count += a_count
+            total += a_total
+            highest = max(highest, a_highest)
+            high += a_high
+        return count, total, highest, high
+
+    def extract_output(self, accumulator: Accumulator) -> Dict[str, Any]:
+        count, total, highest, high = accumulator
+        return {
+            'event_count': count,
+            'max_risk_score': highest if count else None,
+            'avg_risk_score': total / count if count else None,
+            'high_risk_events': high,
+        }
+
+
+def _score_pair(event: Dict[str, Any]) -> Tuple[str, Tuple[float, bool]]:
+    """Key an event by user with only the fields the combine needs."""
+    return event.get('user_id') or 'unknown', (
+        float(event.get('risk_score') or 0.0),
+        event.get('risk_level') == 'HIGH',
+    )
+
+
+class _FormatUserWindow(beam.DoFn):
+    """
+    Flatten a (user_id, aggregates) pair into a table row, with the
+    firing's pane index (0, 1, ... per window) and timing (EARLY,
+    ON_TIME or LATE).
+    """
+
+    def process(
+        self,
+        element: Tuple[str, Dict[str, Any]],
+        win: Any = beam.DoFn.WindowParam,
+        pane: Any = beam.DoFn.PaneInfoParam
+    ) -> Iterator[Dict[str, Any]]:
+        user_id, aggregates = element
+        yield {
+            'user_id': user_id,
+            'window_start': win.start.to_rfc3339(),
+            'window_end': win.end.to_rfc3339(),
+            **aggregates,
+            'pane_index': pane.index,
+            'pane_timing': PaneInfoTiming.to_string(pane.timing),
+        }
+
+
+class WindowedUserRisk(beam.PTransform):
+    """
+    Per-user risk aggregates over sliding event-time windows of
+    window_size seconds, starting every period seconds. Events up to
+    allowed_lateness seconds behind the watermark are still counted.
+
+    With streaming=True, early results fire every EARLY_FIRING_SECONDS
+    and each late event fires its windows again. Panes
+    accumulate, so each firing emits a new row with the window's running
+    totals and the previous rows stay in the table: the row with the
+    highest pane_index per (user_id, window_start) is the current one.
+    """
+
+    def __init__(
+        self,
+        window_size: int,
+        period: int,
+        streaming: bool = False,
+        allowed_lateness: int = ALLOWED_LATENESS_SECONDS
+    ) -> None:
+        super().__init__()
+        self._window_size = window_size
+        self._period = period
+        self._streaming = streaming
+        self._allowed_lateness = allowed_lateness
+
+    def expand(self, events: Any) -> Any:
+        windowing: Dict[str, Any] = {
+            'allowed_lateness': self._allowed_lateness,
+        }
+        if self._streaming:
+            windowing.update({
+                'trigger': trigger.AfterWatermark(
+                    early=trigger.AfterProcessingTime(EARLY_FIRING_SECONDS),
+                    late=trigger.AfterCount(1),
+                ),
+                'accumulation_mode': trigger.AccumulationMode.ACCUMULATING,
+            })
+        return (
+            events
+            | 'EventTime' >> beam.ParDo(AddEventTimestamps())
+            | 'SlidingWindows' >> beam.WindowInto(
+                window.SlidingWindows(self._window_size, self._period),
+                **windowing
+            )
+            | 'KeyByUser' >> beam.Map(_score_pair)
+            | 'AggregatePerUser' >> beam.CombinePerKey(UserRiskCombineFn())
+            | 'FormatRows' >> beam.ParDo(_FormatUserWindow())
+        )
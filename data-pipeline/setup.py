@@ -0,0 +1,35 @@
+"""
+Package the pipeline's modules for Dataflow workers. dataflow_pipeline.py
+passes this file as --setup_file, so each worker installs these modules
+before it unpickles the DoFns that import them.
+"""
+
+import setuptools
+
+setuptools.setup(
+    name='insider-risk-pipeline',
+    version='1.0.0',
+    description='Insider risk event pipeline modules',
+    py_modules=[
+        'baseline_store',
+        'dataflow_pipeline',
+        'dedup',
+        'event_decoding',
+        'ml_anomaly_detection',
+        'parquet_io',
+        'risk_rules',
+        'risk_sketches',
+        'risk_windows',
+        'sqlite_source',
+    ],
+    # apache-beam itself is already on the workers
+    install_requires=[
+        'numpy>=2.0.0',
+        'pandas>=2.2.3',
+        'pyarrow>=14.0.0',
+    ],
+    extras_require={
+        'fast-json': ['msgspec>=0.18.0', 'orjson>=3.9.0'],
+        'yaml-rules': ['PyYAML>=6.0'],
+    },
+)
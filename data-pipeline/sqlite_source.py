@@ -0,0 +1,120 @@
+"""
+Beam source reading risk_events straight from the SQLite database.
+The table is split into id ranges so workers read in parallel.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import apache_beam as beam
+
+from event_decoding import RISK_EVENT_FIELDS
+
+# Default mmap window per reader connection (256 MiB)
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+
+# Rows per id range; each range becomes one unit of parallel work
+DEFAULT_ROWS_PER_SPLIT = 100_000
+
+
+def connect_read_only(
+    db_path: str, mmap_size: int = DEFAULT_MMAP_SIZE
+) -> sqlite3.Connection:
+    """Open a read-only connection with memory-mapped I/O enabled."""
+    uri = Path(db_path).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute(f'PRAGMA mmap_size = {int(mmap_size)}')
+    return conn
+
+
+def split_id_ranges(
+    min_id: int, max_id: int, rows_per_split: int
+) -> List[Tuple[int, int]]:
+    """Split [min_id, max_id] into half-open [start, end) ranges."""
+    if rows_per_split <= 0:
+        raise ValueError('rows_per_split must be positive')
+    return [
+        (start, min(start + rows_per_split, max_id + 1))
+        for start in range(min_id, max_id + 1, rows_per_split)
+    ]
+
+
+class _ReadIdRange(beam.DoFn):
+    """Read one id range of risk_events; one connection per DoFn instance."""
+
+    def __init__(self, db_path: str, mmap_size: int) -> None:
+        self._db_path = db_path
+        self._mmap_size = mmap_size
+        self._conn: Optional[sqlite3.Connection] = None
+        self._query = (
+            f"SELECT {', '.join(RISK_EVENT_FIELDS)} FROM risk_events "
+            "WHERE id >= ? AND id < ? ORDER BY id"
+        )
+
+    def setup(self) -> None:
+        self._conn = connect_read_only(self._db_path, self._mmap_size)
+
+    def teardown(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def process(
+        self, id_range: Tuple[int, int]
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield each row in the range as a typed dict."""
+        if self._conn is None:
+            self.setup()
+        cursor = self._conn.execute(  # type: ignore[union-attr]
+            self._query, id_range
+        )
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(RISK_EVENT_FIELDS, row))
+
+
+class ReadRiskEventsFromSqlite(beam.PTransform):
+    """
+    Read the risk_events table of an SQLite database (e.g.
+    databases/insider_risk.db) as row dicts, split into id ranges.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        rows_per_split: int = DEFAULT_ROWS_PER_SPLIT,
+        mmap_size: int = DEFAULT_MMAP_SIZE
+    ) -> None:
+        super().__init__()
+        self._db_path = db_path
+        self._rows_per_split = rows_per_split
+        self._mmap_size = mmap_size
+
+    def _id_ranges(self) -> List[Tuple[int, int]]:
+        conn = connect_read_only(self._db_path, self._mmap_size)
+        try:
+            min_id, max_id = conn.execute(
+                'SELECT MIN(id), MAX(id) FROM risk_events'
+            ).fetchone()
+        finally:
+            conn.close()
+        if min_id is None:
+            return []
+        return split_id_ranges(min_id, max_id, self._rows_per_split)
+
+    def expand(self, pbegin: Any) -> Any:
+        return (
+            pbegin
+            | 'IdRanges' >> beam.Create(self._id_ranges())
+            # Spread the ranges across workers before reading
+            | 'Distribute' >> beam.Reshuffle()
+            | 'ReadRanges' >> beam.ParDo(
+                _ReadIdRange(self._db_path, self._mmap_size)
+            )
+        )
@@ -0,0 +1,158 @@
+"""
+Query-plan checks for the analytics backends: time-filtered queries must
+search idx_timestamp on SQLite, and scan only recent daily partitions of
+the risk_events table the pipeline writes to BigQuery.
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from analytics_backends import BigQueryBackend, SQLiteBackend
+from bigquery_queries import BigQueryAnalytics
+from dataflow_pipeline import EVENT_TABLE_PARAMETERS, RISK_EVENTS_TABLE
+
+# Scratch dataset ('project.dataset') for the BigQuery dry-run test
+BIGQUERY_TEST_DATASET = os.environ.get('BIGQUERY_TEST_DATASET')
+
+# risk_events and its indexes as created by databases/init_databases.py
+RISK_EVENTS_SCHEMA = """
+CREATE TABLE risk_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    timestamp DATETIME NOT NULL,
+    risk_score REAL,
+    risk_level TEXT
+);
+CREATE INDEX idx_user_id ON risk_events(user_id);
+CREATE INDEX idx_timestamp ON risk_events(timestamp);
+CREATE INDEX idx_risk_level ON risk_events(risk_level);
+"""
+
+
+@pytest.fixture
+def analytics(tmp_path):
+    db_path = str(tmp_path / 'insider_risk.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript(RISK_EVENTS_SCHEMA)
+    conn.executemany(
+        'INSERT INTO risk_events '
+        '(user_id, event_type, timestamp, risk_score, risk_level) '
+        "VALUES (?, 'LOGIN', datetime('now', ?), 30.0, 'LOW')",
+        [(f'user{i % 10}', f'-{i} hours') for i in range(1000)],
+    )
+    conn.commit()
+    conn.close()
+    analytics = BigQueryAnalytics(backend=SQLiteBackend(db_path))
+    yield analytics
+    analytics.close()
+
+
+def _plan(analytics, query_and_params):
+    return ' | '.join(analytics.explain(*query_and_params)['detail'])
+
+
+@pytest.mark.parametrize(
+    'builder', ['risk_summary_query', 'risk_events_query']
+)
+def test_time_filter_searches_timestamp_index(analytics, builder):
+    filtered = _plan(analytics, getattr(analytics, builder)(days=7))
+    unfiltered = _plan(analytics, getattr(analytics, builder)(days=None))
+
+    assert 'SEARCH risk_events USING INDEX idx_timestamp' in filtered
+    assert 'SCAN risk_events' not in filtered
+    assert 'SCAN risk_events' in unfiltered
+    assert 'SEARCH' not in unfiltered
+
+
+def test_bigquery_time_filter_targets_partition_column():
+    analytics = BigQueryAnalytics(
+        backend=BigQueryBackend('project', 'dataset')
+    )
+    query, params = analytics.risk_summary_query(days=7)
+
+    assert RISK_EVENTS_TABLE == 'risk_events'
+    assert '`project.dataset.risk_events`' in query
+    assert (
+        'timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @days DAY)'
+        in query
+    )
+    assert params == {'days': ('INT64', 7)}
+    assert EVENT_TABLE_PARAMETERS['timePartitioning'] == {
+        'type': 'DAY', 'field': 'timestamp'
+    }
+
+
+@pytest.fixture
+def bigquery_analytics():
+    """
+    risk_events created as the pipeline creates it, in the scratch
+    dataset, with one event a day over the last 60 days.
+    """
+    if not BIGQUERY_TEST_DATASET:
+        pytest.skip('BIGQUERY_TEST_DATASET is not set')
+    bigquery = pytest.importorskip('google.cloud.bigquery')
+
+    project_id, dataset_id = BIGQUERY_TEST_DATASET.split('.')
+    client = bigquery.Client(project=project_id)
+    table = bigquery.Table(
+        f'{project_id}.{dataset_id}.{RISK_EVENTS_TABLE}',
+        schema=[
+            bigquery.SchemaField('user_id', 'STRING'),
+            bigquery.SchemaField('event_type', 'STRING'),
+            bigquery.SchemaField('timestamp', 'TIMESTAMP'),
+            bigquery.SchemaField('risk_score', 'FLOAT'),
+            bigquery.SchemaField('risk_level', 'STRING'),
+        ],
+    )
+    partitioning = EVENT_TABLE_PARAMETERS['timePartitioning']
+    table.time_partitioning = bigquery.TimePartitioning(
+        type_=partitioning['type'], field=partitioning['field']
+    )
+    table.clustering_fields = EVENT_TABLE_PARAMETERS['clustering']['fields']
+    client.delete_table(table, not_found_ok=True)
+    table = client.create_table(table)
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            'user_id': f'user{i % 10}',
+            'event_type': 'login',
+            'timestamp': (now - timedelta(days=i)).isoformat(),
+            'risk_score': 30.0,
+            'risk_level': 'LOW',
+        }
+        for i in range(60)
+    ]
+    # A load job, so the rows are in their partitions (not the streaming
+    # buffer) when the dry runs estimate bytes
+    client.load_table_from_json(rows, table).result()
+
+    analytics = BigQueryAnalytics(
+        project_id, dataset_id, cache_ttl_seconds=0
+    )
+    yield analytics
+    analytics.close()
+    client.delete_table(table, not_found_ok=True)
+
+
+def _bytes_processed(analytics, query_and_params):
+    return int(
+        analytics.explain(*query_and_params)['total_bytes_processed'][0]
+    )
+
+
+@pytest.mark.parametrize(
+    'builder', ['risk_summary_query', 'risk_events_query']
+)
+def test_bigquery_time_filter_prunes_partitions(bigquery_analytics, builder):
+    build = getattr(bigquery_analytics, builder)
+    filtered = _bytes_processed(bigquery_analytics, build(days=7))
+    unfiltered = _bytes_processed(bigquery_analytics, build(days=None))
+
+    # 8 of the 60 daily partitions at most
+    assert 0 < filtered < unfiltered
+    assert filtered * 5 < unfiltered
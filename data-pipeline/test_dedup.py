@@ -0,0 +1,116 @@
+"""
+DeduplicateEvents must drop every repeat of an event, whichever bundle
+or worker sees it, and never drop a distinct event because its Bloom
+filter lookup was a false positive.
+"""
+
+import random
+
+import apache_beam as beam
+import pytest
+from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.util import assert_that, equal_to
+
+from dedup import (
+    DEDUP_KEYS, BloomFilter, DeduplicateEvents, _DropDuplicates, event_key
+)
+
+
+def _distinct_events(count):
+    return [
+        {
+            'user_id': f'user{i % 17}',
+            'event_type': ('login', 'file_access', 'data_export')[i % 3],
+            'timestamp': f'2024-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}',
+            'risk_score': float(i % 100),
+        }
+        for i in range(count)
+    ]
+
+
+def _with_replays(events, copies=3, seed=7):
+    """Each event copies times, shuffled so copies land in any bundle."""
+    replayed = [dict(event) for event in events for _ in range(copies)]
+    random.Random(seed).shuffle(replayed)
+    return replayed
+
+
+class _State:
+    """ReadModifyWriteState stand-in shared between DoFn instances."""
+
+    def __init__(self):
+        self.value = None
+
+    def read(self):
+        return self.value
+
+    def write(self, value):
+        self.value = value
+
+    def clear(self):
+        self.value = None
+
+
+class _Timer:
+    def set(self, timestamp):
+        pass
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_duplicates_dropped_across_bundles_and_workers(streaming):
+    events = _distinct_events(500)
+    options = PipelineOptions(
+        direct_num_workers=4, direct_running_mode='multi_threading'
+    )
+
+    with TestPipeline(options=options) as p:
+        deduplicated = (
+            p
+            | beam.Create(_with_replays(events))
+            | DeduplicateEvents(streaming=streaming)
+        )
+        assert_that(deduplicated, equal_to(events))
+
+
+def test_key_moved_to_another_worker_is_still_dropped():
+    """
+    Streaming runners may move a key between workers; the new worker's
+    empty Bloom filter says 'not seen', so state must still be read.
+    """
+    states = {}
+    workers = [
+        _DropDuplicates(False, 60, 1000, 0.01, 'dedup') for _ in range(2)
+    ]
+    emitted = []
+    for i, event in enumerate(_with_replays(_distinct_events(200))):
+        worker = workers[i % 2]
+        if i % 50 == 0:
+            worker.finish_bundle()
+        key = event_key(event, DEDUP_KEYS['fields'])
+        state = states.setdefault(key, _State())
+        emitted.extend(worker.process((key, event), 0, state, _Timer()))
+
+    assert sorted(map(repr, emitted)) == sorted(
+        map(repr, _distinct_events(200))
+    )
+
+
+def test_bloom_false_positives_keep_distinct_events():
+    capacity, error_rate = 1, 0.5
+    bloom = BloomFilter(capacity, error_rate)
+    for i in range(50):
+        bloom.add(f'seen{i}')
+    # The filter is saturated, so unseen keys test positive
+    assert sum(f'unseen{i}' in bloom for i in range(100)) > 50
+
+    events = _distinct_events(300)
+    with TestPipeline() as p:
+        deduplicated = (
+            p
+            | beam.Create(_with_replays(events, copies=2))
+            | DeduplicateEvents(
+                bloom_capacity=capacity, bloom_error_rate=error_rate
+            )
+        )
+        assert_that(deduplicated, equal_to(events))
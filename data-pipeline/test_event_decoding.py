@@ -0,0 +1,70 @@
+"""
+Every JSON backend must decode the same line into the same row, including
+input that is not in the canonical risk_events shape.
+"""
+
+import json
+
+import pytest
+
+from event_decoding import DECODER_BACKENDS, get_decoder
+
+NON_CANONICAL_EVENTS = [
+    # Canonical row, with detector features
+    {'id': 1, 'user_id': 'user1', 'event_type': 'LOGIN',
+     'timestamp': '2024-01-01 09:00:00', 'sensitive_data_access': 1,
+     'unusual_time': 0, 'large_data_transfer': 0, 'privileged_action': 0,
+     'file_access_count': 12, 'data_transfer_size_mb': 3.5},
+    # Int user_id, string id and string risk_score
+    {'id': '42', 'user_id': 1001, 'event_type': 'Data_Export',
+     'risk_score': '75', 'risk_level': 'HIGH'},
+    # Flags as strings and bools, timestamp as epoch seconds
+    {'user_id': 'user2', 'event_type': 'FILE_DOWNLOAD',
+     'timestamp': 1704099600, 'sensitive_data_access': 'yes',
+     'unusual_time': 'false', 'large_data_transfer': True,
+     'privileged_action': '1'},
+    # Keys outside the schema, including nested values
+    {'user_id': 'user3', 'event_type': 'EMAIL_SEND', 'source_ip': '10.0.0.1',
+     'tags': ['a', 'b'], 'device': {'os': 'linux'}},
+    # Missing keys and explicit nulls
+    {'user_id': 'user4'},
+    {'user_id': None, 'event_type': None, 'risk_score': None,
+     'file_access_count': None},
+    # Non-string event_type
+    {'user_id': 'user5', 'event_type': 7, 'hour_of_day': '23'},
+]
+
+
+def _installed_backends():
+    backends = []
+    for backend in DECODER_BACKENDS:
+        if backend == 'auto':
+            continue
+        try:
+            get_decoder(backend)
+        except ImportError:
+            continue
+        backends.append(backend)
+    return backends
+
+
+@pytest.mark.parametrize('backend', _installed_backends())
+@pytest.mark.parametrize(
+    'event', NON_CANONICAL_EVENTS,
+    ids=[str(i) for i in range(len(NON_CANONICAL_EVENTS))],
+)
+def test_backends_decode_to_same_row(backend, event):
+    line = json.dumps(event)
+    expected = get_decoder('json')(line)
+    decoded = get_decoder(backend)(line)
+
+    assert decoded.to_dict() == expected.to_dict()
+    for key in set(event) | {'risk_score', 'missing_key'}:
+        assert decoded.get(key, 'default') == expected.get(key, 'default')
+
+
+@pytest.mark.parametrize('backend', _installed_backends())
+@pytest.mark.parametrize('line', ['not json', '[1, 2]', '"text"', ''])
+def test_backends_reject_non_objects(backend, line):
+    with pytest.raises(Exception):
+        get_decoder(backend)(line)
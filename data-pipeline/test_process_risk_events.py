@@ -0,0 +1,115 @@
+"""
+ProcessRiskEventsBatched must score Arrow record batches exactly as
+ProcessRiskEvents scores the same rows one at a time.
+"""
+
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pytest
+
+from dataflow_pipeline import ProcessRiskEvents, ProcessRiskEventsBatched
+from parquet_io import format_timestamps, record_batch_rows
+
+
+def _timestamps(count):
+    return pa.array(
+        [datetime(2024, 1, 1, i % 24, 30, tzinfo=timezone.utc)
+         for i in range(count)],
+        pa.timestamp('us', tz='UTC'),
+    )
+
+
+def _generated_batch():
+    """Columns as written by databases/generate_events.py --parquet."""
+    count = 64
+    return pa.table({
+        'id': pa.array(range(1, count + 1), pa.int64()),
+        'user_id': [f'user{i % 7}' for i in range(count)],
+        'event_type': [
+            ('DATA_EXPORT', 'LOGIN', 'FILE_DOWNLOAD')[i % 3]
+            for i in range(count)
+        ],
+        'timestamp': _timestamps(count),
+        'sensitive_data_access': [i % 2 for i in range(count)],
+        'unusual_time': [i % 3 == 0 for i in range(count)],
+        'large_data_transfer': [i % 5 == 0 for i in range(count)],
+        'privileged_action': [int(i % 7 == 0) for i in range(count)],
+        'file_access_count': [i for i in range(count)],
+        'data_transfer_size_mb': [float(i) / 3 for i in range(count)],
+    })
+
+
+def _mixed_batch():
+    """Nulls, text flags, existing scores and levels, a NaN score."""
+    return pa.table({
+        'user_id': ['a', 'b', None, 'd', 'e', 'f', 'g'],
+        'event_type': ['Login', None, 'DATA_export', 'x', 'PRIVILEGED_OP',
+                       'y', 'z'],
+        'timestamp': pa.array(
+            ['2024-01-01 09:00:00', None, '2024-01-02 23:00:00',
+             '2024-01-03 01:00:00', '2024-01-03 02:00:00',
+             '2024-01-03 03:00:00', '2024-01-03 04:00:00']
+        ),
+        'risk_score': pa.array(
+            [None, 55.0, None, 71.9, float('nan'), None, 12.0]
+        ),
+        'risk_level': [None, None, 'LOW', None, None, 'HIGH', 'MEDIUM'],
+        'sensitive_data_access': ['yes', 'no', None, 'TRUE', '1', '0', 'x'],
+        'unusual_time': pa.array([None] * 7, pa.bool_()),
+        'large_data_transfer': pa.array([1, 0, None, 2, -1, 0, 1], pa.int8()),
+        'file_access_count': pa.array([None, 1, 2, None, 4, 5, 6], pa.int64()),
+    })
+
+
+def _unscored_batch():
+    """No score, level or flag columns beyond one."""
+    return pa.table({
+        'user_id': ['a', 'b', 'c'],
+        'event_type': ['LOGIN', 'EMAIL_SEND', 'DATA_EXPORT'],
+        'privileged_action': [True, False, None],
+    })
+
+
+def _float_flag_batch():
+    """Float flags are passed through, so the batch is done per row."""
+    return pa.table({
+        'user_id': ['a', 'b'],
+        'event_type': ['LOGIN', 'DATA_EXPORT'],
+        'sensitive_data_access': [1.0, 0.0],
+    })
+
+
+def _run_per_element(table):
+    process = ProcessRiskEvents()
+    process.setup()
+    rows = [out for row in record_batch_rows(table)
+            for out in process.process(row)]
+    return rows, process
+
+
+def _run_batched(table):
+    process = ProcessRiskEventsBatched()
+    process.setup()
+    rows = list(process.process(format_timestamps(table)))
+    return rows, process
+
+
+@pytest.mark.parametrize('make_batch', [
+    _generated_batch, _mixed_batch, _unscored_batch, _float_flag_batch,
+])
+def test_batched_matches_per_element(make_batch):
+    expected, per_element = _run_per_element(make_batch())
+    rows, batched = _run_batched(make_batch())
+
+    assert rows == expected
+    assert [list(row) for row in rows] == [list(row) for row in expected]
+    assert batched._bundle_levels == per_element._bundle_levels
+    assert batched._bundle_failed == per_element._bundle_failed
+
+
+def test_nan_score_without_level_fails_event():
+    rows, batched = _run_batched(_mixed_batch())
+
+    assert batched._bundle_failed == 1
+    assert len(rows) == _mixed_batch().num_rows - 1
@@ -0,0 +1,96 @@
+"""
+Rules files must compile to the same scoring, levels and routing as
+DEFAULT_RULES, whether written as JSON or YAML.
+"""
+
+import itertools
+import json
+
+import numpy as np
+import pytest
+
+from event_decoding import RISK_FLAG_FIELDS, RiskEvent
+from risk_rules import DEFAULT_RISK_RULES, DEFAULT_RULES, load_rules
+
+EVENT_TYPES = [
+    'login', 'file_access', 'data_export', 'admin_login', 'privileged_op',
+    'sensitive_file_export', 'authentication_failure', 'email_send', '',
+]
+
+
+def _write_json(path, rules):
+    path.write_text(json.dumps(rules))
+
+
+def _write_yaml(path, rules):
+    yaml = pytest.importorskip('yaml')
+    path.write_text(yaml.safe_dump(rules))
+
+
+@pytest.fixture(params=[('rules.json', _write_json),
+                        ('rules.yaml', _write_yaml),
+                        ('rules.yml', _write_yaml)],
+                ids=lambda param: param[0])
+def write_rules(request, tmp_path):
+    name, write = request.param
+
+    def write_rules(rules):
+        path = tmp_path / name
+        write(path, rules)
+        return load_rules(str(path))
+
+    return write_rules
+
+
+def _flag_events():
+    """One event per combination of the four risk flags."""
+    for flags in itertools.product([False, True], repeat=4):
+        yield RiskEvent.from_mapping({
+            'user_id': 'alice',
+            'event_type': 'login',
+            **dict(zip(RISK_FLAG_FIELDS, flags)),
+        })
+
+
+def test_default_rules_file_matches_defaults(write_rules):
+    rules = write_rules(DEFAULT_RULES)
+
+    np.testing.assert_array_equal(
+        rules.score_lut, DEFAULT_RISK_RULES.score_lut
+    )
+    np.testing.assert_array_equal(
+        rules.level_thresholds, DEFAULT_RISK_RULES.level_thresholds
+    )
+    scores = np.arange(0, 101)
+    np.testing.assert_array_equal(
+        rules.levels(scores), DEFAULT_RISK_RULES.levels(scores)
+    )
+    for event in _flag_events():
+        assert (
+            rules.score_and_level(event)
+            == DEFAULT_RISK_RULES.score_and_level(event)
+        )
+    for event_type, sensitive in itertools.product(
+        EVENT_TYPES, [True, False]
+    ):
+        event = {
+            'event_type': event_type, 'sensitive_data_access': sensitive
+        }
+        assert rules.routes(event) == DEFAULT_RISK_RULES.routes(event)
+
+
+def test_partial_rules_file_keeps_other_defaults(write_rules):
+    rules = write_rules({'level_thresholds': {'MEDIUM': 30, 'HIGH': 60}})
+
+    np.testing.assert_array_equal(
+        rules.score_lut, DEFAULT_RISK_RULES.score_lut
+    )
+    assert rules.levels(np.array([29, 30, 59, 60])).tolist() == [
+        'LOW', 'MEDIUM', 'MEDIUM', 'HIGH'
+    ]
+    assert rules.routes({'event_type': 'data_export'}) == ('data_transfer',)
+
+
+def test_invalid_rules_file_raises(write_rules):
+    with pytest.raises(ValueError):
+        write_rules({'flag_weights': {'not_a_flag': 10}})
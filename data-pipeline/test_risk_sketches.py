@@ -0,0 +1,64 @@
+"""
+Streaming behaviour of DailyRiskSketches under TestStream: a late event
+adds a row holding only the late events, so merging a day's rows counts
+every event once, and events past the allowed lateness are dropped.
+"""
+
+from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.test_stream import TestStream
+from apache_beam.testing.util import assert_that
+from apache_beam.transforms import window
+
+from risk_sketches import (
+    SECONDS_PER_DAY,
+    DailyRiskSketches,
+    merge_sketch_rows,
+    top_users,
+)
+
+LATENESS_SECONDS = 60 * 60
+
+
+def _event(user_id, seconds, risk_score):
+    """An event at epoch seconds, stamped as AddEventTimestamps would."""
+    return window.TimestampedValue(
+        {
+            'user_id': user_id,
+            'timestamp': seconds,
+            'risk_score': risk_score,
+            'risk_level': 'LOW',
+        },
+        seconds,
+    )
+
+
+def _check_rows(rows):
+    assert sorted(row['event_count'] for row in rows) == [1, 2]
+    assert {row['date'] for row in rows} == {'1970-01-01'}
+    count, users, _ = merge_sketch_rows(rows, risk_levels=['LOW'])
+    assert count == 3
+    assert users.count() == 2
+    assert top_users(rows, k=2) == [('alice', 60.0), ('bob', 20.0)]
+
+
+def test_late_rows_merge_without_double_counting():
+    stream = (
+        TestStream()
+        .add_elements([_event('alice', 10, 50.0), _event('bob', 20, 20.0)])
+        .advance_watermark_to(SECONDS_PER_DAY)
+        # Behind the watermark but within the allowed lateness
+        .add_elements([_event('alice', 30, 10.0)])
+        .advance_watermark_to(SECONDS_PER_DAY + LATENESS_SECONDS + 1)
+        # The day's state has expired, so this event is dropped
+        .add_elements([_event('carol', 40, 90.0)])
+        .advance_watermark_to_infinity()
+    )
+
+    with TestPipeline(options=PipelineOptions(streaming=True)) as p:
+        rows = (
+            p
+            | stream
+            | DailyRiskSketches(allowed_lateness=LATENESS_SECONDS)
+        )
+        assert_that(rows, _check_rows)
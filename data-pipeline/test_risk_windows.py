@@ -0,0 +1,94 @@
+"""
+Streaming behaviour of WindowedUserRisk under TestStream: late events
+within the allowed lateness fire their window again as a LATE pane with
+the running totals, and events past it are dropped.
+"""
+
+from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.test_stream import TestStream
+from apache_beam.testing.util import assert_that, equal_to
+from apache_beam.transforms import window
+
+from risk_windows import WindowedUserRisk
+
+WINDOW_SECONDS = 60
+LATENESS_SECONDS = 300
+
+
+def _event(user_id, seconds, risk_score, risk_level='LOW'):
+    """An event at epoch seconds, stamped as AddEventTimestamps would."""
+    return window.TimestampedValue(
+        {
+            'user_id': user_id,
+            'timestamp': seconds,
+            'risk_score': risk_score,
+            'risk_level': risk_level,
+        },
+        seconds,
+    )
+
+
+def _row(user_id, aggregates, pane_index, pane_timing):
+    count, max_score, avg_score, high = aggregates
+    return {
+        'user_id': user_id,
+        'window_start': '1970-01-01T00:00:00Z',
+        'window_end': '1970-01-01T00:01:00Z',
+        'event_count': count,
+        'max_risk_score': max_score,
+        'avg_risk_score': avg_score,
+        'high_risk_events': high,
+        'pane_index': pane_index,
+        'pane_timing': pane_timing,
+    }
+
+
+def _run(stream, expected):
+    options = PipelineOptions(streaming=True)
+    with TestPipeline(options=options) as p:
+        rows = (
+            p
+            | stream
+            | WindowedUserRisk(
+                WINDOW_SECONDS, WINDOW_SECONDS, streaming=True,
+                allowed_lateness=LATENESS_SECONDS
+            )
+        )
+        assert_that(rows, equal_to(expected))
+
+
+def test_on_time_pane_then_late_pane_with_running_totals():
+    stream = (
+        TestStream()
+        .add_elements([
+            _event('alice', 10, 50.0),
+            _event('alice', 20, 90.0, 'HIGH'),
+            _event('bob', 30, 20.0),
+        ])
+        .advance_watermark_to(WINDOW_SECONDS)
+        # Behind the watermark but within the allowed lateness
+        .add_elements([_event('alice', 30, 10.0)])
+        .advance_watermark_to_infinity()
+    )
+
+    _run(stream, [
+        _row('alice', (2, 90.0, 70.0, 1), 0, 'ON_TIME'),
+        _row('bob', (1, 20.0, 20.0, 0), 0, 'ON_TIME'),
+        _row('alice', (3, 90.0, 50.0, 1), 1, 'LATE'),
+    ])
+
+
+def test_event_past_allowed_lateness_is_dropped():
+    stream = (
+        TestStream()
+        .add_elements([_event('alice', 10, 50.0)])
+        .advance_watermark_to(WINDOW_SECONDS + LATENESS_SECONDS + 1)
+        # The window's state has expired, so this event changes nothing
+        .add_elements([_event('alice', 20, 90.0, 'HIGH')])
+        .advance_watermark_to_infinity()
+    )
+
+    _run(stream, [
+        _row('alice', (1, 50.0, 50.0, 0), 0, 'ON_TIME'),
+    ])
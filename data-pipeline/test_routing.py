@@ -0,0 +1,134 @@
+"""
+RouteRiskEvents must send each event to the same tables as the original
+per-table filter predicates, including events matching several tables.
+"""
+
+import itertools
+
+import apache_beam as beam
+import pytest
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.util import assert_that, equal_to
+
+from dataflow_pipeline import RouteRiskEvents
+from risk_rules import OTHER_TAG, ROUTE_TAGS, SENSITIVE_TAG
+
+
+# The filter_* predicates as they were before routing moved into
+# risk_rules, one per output tag
+def _legacy_access(event):
+    event_type = str(event.get('event_type', '')).lower()
+    return 'access' in event_type or 'file' in event_type
+
+
+def _legacy_data_transfer(event):
+    event_type = str(event.get('event_type', '')).lower()
+    return (
+        'transfer' in event_type or
+        'download' in event_type or
+        'export' in event_type
+    )
+
+
+def _legacy_privileged(event):
+    event_type = str(event.get('event_type', '')).lower()
+    return 'privileged' in event_type or 'admin' in event_type
+
+
+def _legacy_auth(event):
+    event_type = str(event.get('event_type', '')).lower()
+    return 'authentication' in event_type or 'login' in event_type
+
+
+def _legacy_sensitive(event):
+    return bool(
+        event.get('sensitive_data_access', False) or
+        'sensitive' in event.get('event_type', '').lower()
+    )
+
+
+def _legacy_other(event):
+    event_type = str(event.get('event_type', '')).lower()
+    sensitive_access = event.get('sensitive_data_access', False)
+    if isinstance(sensitive_access, int):
+        sensitive_access = bool(sensitive_access)
+    return not any([
+        'access' in event_type,
+        'transfer' in event_type,
+        'download' in event_type,
+        'export' in event_type,
+        'privileged' in event_type,
+        'admin' in event_type,
+        'authentication' in event_type,
+        'login' in event_type,
+        sensitive_access
+    ])
+
+
+LEGACY_FILTERS = {
+    'access': _legacy_access,
+    'data_transfer': _legacy_data_transfer,
+    'privileged': _legacy_privileged,
+    'authentication': _legacy_auth,
+    SENSITIVE_TAG: _legacy_sensitive,
+    OTHER_TAG: _legacy_other,
+}
+
+EVENT_TYPES = [
+    'login', 'LOGIN', 'logout', 'authentication_failure', 'file_access',
+    'FILE_DOWNLOAD', 'data_export', 'bulk_transfer', 'admin_login',
+    'privileged_command', 'sensitive_file_export', 'sensitive_report',
+    'email_send', 'print_document', 'file_delete', '',
+]
+
+SENSITIVE_VALUES = [True, False, 1, 0, None]
+
+
+def _events():
+    for event_type, sensitive in itertools.product(
+        EVENT_TYPES, SENSITIVE_VALUES
+    ):
+        event = {'user_id': 'alice', 'event_type': event_type}
+        if sensitive is not None:
+            event['sensitive_data_access'] = sensitive
+        yield event
+    # Unset columns are left out of rows (RiskEvent.to_dict)
+    yield {'user_id': 'alice'}
+    yield {'user_id': 'alice', 'sensitive_data_access': True}
+
+
+def _legacy_tags(event):
+    return [tag for tag in ROUTE_TAGS if LEGACY_FILTERS[tag](event)]
+
+
+def test_legacy_filters_cover_every_tag():
+    assert set(LEGACY_FILTERS) == set(ROUTE_TAGS)
+
+
+@pytest.mark.parametrize('event', list(_events()), ids=repr)
+def test_routes_match_legacy_filters(event):
+    route = RouteRiskEvents()
+    route.setup()
+    route.start_bundle()
+
+    tags = [output.tag for output in route.process(dict(event))]
+
+    assert tags == _legacy_tags(event)
+
+
+def test_multi_table_events_reach_every_output():
+    events = list(_events())
+    assert any(len(_legacy_tags(event)) > 1 for event in events)
+
+    with TestPipeline() as p:
+        routed = (
+            p
+            | beam.Create(events)
+            | beam.ParDo(RouteRiskEvents()).with_outputs(*ROUTE_TAGS)
+        )
+        for tag in ROUTE_TAGS:
+            assert_that(
+                routed[tag],
+                equal_to([e for e in events if LEGACY_FILTERS[tag](e)]),
+                label=f'Check{tag}',
+            )
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic risk events at scale for load and throughput testing.
+Streams events in chunks into the SQLite risk_events table and/or JSONL
+and Parquet files for the data pipeline.
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+script_dir = Path(__file__).parent
+
+# Event types with relative frequencies (logins dominate, exports are rare)
+EVENT_TYPES = {
+    "LOGIN": 30,
+    "DATA_ACCESS": 25,
+    "EMAIL_SEND": 15,
+    "FILE_DOWNLOAD": 12,
+    "SENSITIVE_FILE_ACCESS": 8,
+    "PRIVILEGED_ACTION": 6,
+    "DATA_EXPORT": 4,
+}
+
+# Probability of each risk flag per event type:
+# (sensitive_data_access, large_data_transfer, privileged_action)
+FLAG_PROBABILITIES = {
+    "LOGIN": (0.01, 0.0, 0.02),
+    "DATA_ACCESS": (0.30, 0.02, 0.01),
+    "EMAIL_SEND": (0.05, 0.05, 0.0),
+    "FILE_DOWNLOAD": (0.25, 0.30, 0.0),
+    "SENSITIVE_FILE_ACCESS": (0.95, 0.10, 0.05),
+    "PRIVILEGED_ACTION": (0.20, 0.02, 0.95),
+    "DATA_EXPORT": (0.60, 0.70, 0.10),
+}
+
+# Same scoring as the pipeline's ProcessRiskEvents
+FLAG_WEIGHTS = {
+    "sensitive_data_access": 30,
+    "unusual_time": 20,
+    "large_data_transfer": 40,
+    "privileged_action": 25,
+}
+
+RISK_EVENT_COLUMNS = (
+    "user_id", "event_type", "timestamp", "risk_score", "risk_level",
+    "sensitive_data_access", "unusual_time", "large_data_transfer", "privileged_action",
+)
+
+# Indexes created by init_databases.py; dropped during bulk loads
+RISK_EVENT_INDEXES = {
+    "idx_user_id": "CREATE INDEX IF NOT EXISTS idx_user_id ON risk_events(user_id)",
+    "idx_timestamp": "CREATE INDEX IF NOT EXISTS idx_timestamp ON risk_events(timestamp)",
+    "idx_risk_level": "CREATE INDEX IF NOT EXISTS idx_risk_level ON risk_events(risk_level)",
+}
+
+CREATE_RISK_EVENTS = """
+CREATE TABLE IF NOT EXISTS risk_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    timestamp DATETIME NOT NULL,
+    risk_score REAL,
+    risk_level TEXT,
+    sensitive_data_access INTEGER DEFAULT 0,
+    unusual_time INTEGER DEFAULT 0,
+    large_data_transfer INTEGER DEFAULT 0,
+    privileged_action INTEGER DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# Working hours; events outside them set unusual_time
+WORKDAY_START_HOUR = 7
+WORKDAY_END_HOUR = 19
+
+
+def make_users(num_users, rng):
+    """
+    Users with Zipf-like activity weights (a few very active accounts,
+    a long tail of quiet ones) and a typical shift start hour each.
+    """
+    users = []
+    for rank in range(1, num_users + 1):
+        users.append({
+            "user_id": f"user{rank:06d}",
+            "weight": 1.0 / rank ** 0.8,
+            "shift_start": rng.choice((6, 7, 8, 8, 9, 9, 10, 14, 22)),
+            # Per-user feature scale for the anomaly detector columns
+            "access_mean": rng.uniform(5, 60),
+            "transfer_mean": rng.uniform(1, 200),
+        })
+    return users
+
+
+def generate_events(count, num_users=10_000, days=30, end=None, seed=42, chunk_size=100_000):
+    """
+    Yield lists of up to chunk_size event dicts. Each event also carries
+    file_access_count and data_transfer_size_mb for the anomaly detector.
+    """
+    rng = random.Random(seed)
+    users = make_users(num_users, rng)
+    user_weights = []
+    total = 0.0
+    for user in users:
+        total += user["weight"]
+        user_weights.append(total)
+    event_types = list(EVENT_TYPES)
+    type_weights = []
+    total = 0
+    for name in event_types:
+        total += EVENT_TYPES[name]
+        type_weights.append(total)
+
+    end = end or datetime.now()
+    # Format each day once; per-event times are appended as HH:MM:SS
+    dates = [
+        (end - timedelta(days=offset)).strftime("%Y-%m-%d")
+        for offset in range(max(days, 1), 0, -1)
+    ]
+
+    produced = 0
+    while produced < count:
+        size = min(chunk_size, count - produced)
+        chunk_users = rng.choices(users, cum_weights=user_weights, k=size)
+        chunk_types = rng.choices(event_types, cum_weights=type_weights, k=size)
+        chunk = []
+        for user, event_type in zip(chunk_users, chunk_types):
+            # Mostly within the user's 9-hour shift, occasionally any hour
+            if rng.random() < 0.05:
+                hour = rng.randrange(24)
+            else:
+                hour = (user["shift_start"] + rng.randrange(9)) % 24
+            timestamp = f"{rng.choice(dates)} {hour:02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+
+            p_sensitive, p_transfer, p_privileged = FLAG_PROBABILITIES[event_type]
+            flags = {
+                "sensitive_data_access": int(rng.random() < p_sensitive),
+                "unusual_time": int(not WORKDAY_START_HOUR <= hour < WORKDAY_END_HOUR),
+                "large_data_transfer": int(rng.random() < p_transfer),
+                "privileged_action": int(rng.random() < p_privileged),
+            }
+            score = float(min(sum(FLAG_WEIGHTS[f] for f, v in flags.items() if v), 100))
+            level = "HIGH" if score >= 70 else "MEDIUM" if score >= 40 else "LOW"
+
+            transfer_scale = 10.0 if flags["large_data_transfer"] else 1.0
+            chunk.append({
+                "user_id": user["user_id"],
+                "event_type": event_type,
+                "timestamp": timestamp,
+                "risk_score": score,
+                "risk_level": level,
+                **flags,
+                "file_access_count": max(0, int(rng.gauss(user["access_mean"], user["access_mean"] / 4))),
+                "data_transfer_size_mb": round(rng.expovariate(1.0 / user["transfer_mean"]) * transfer_scale, 2),
+            })
+        produced += size
+        yield chunk
+
+
+def load_sqlite(db_path, chunks, commit_every=1_000_000):
+    """
+    Bulk load event chunks into risk_events with executemany, WAL and
+    synchronous=OFF. Indexes are dropped during the load and rebuilt once
+    at the end, which is far cheaper than updating them per row. The
+    indexes and the previous journal_mode and synchronous settings are
+    restored even if the load fails, so an interrupted load leaves the
+    rows committed so far indexed and the database in its usual mode.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    indexes_dropped = False
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(CREATE_RISK_EVENTS)
+        indexes_dropped = True
+        for name in RISK_EVENT_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+        insert = (
+            f"INSERT INTO risk_events ({', '.join(RISK_EVENT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(RISK_EVENT_COLUMNS))})"
+        )
+        loaded = 0
+        conn.execute("BEGIN")
+        for chunk in chunks:
+            conn.executemany(insert, [tuple(e[c] for c in RISK_EVENT_COLUMNS) for e in chunk])
+            loaded += len(chunk)
+            if loaded % commit_every < len(chunk):
+                conn.execute("COMMIT")
+                conn.execute("BEGIN")
+        conn.execute("COMMIT")
+        return loaded
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        if indexes_dropped:
+            for statement in RISK_EVENT_INDEXES.values():
+                conn.execute(statement)
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        conn.close()
+
+
+def next_sqlite_id(db_path):
+    """
+    The id risk_events' AUTOINCREMENT will assign to the next row of
+    db_path (1 for a new database), so file outputs get the same ids.
+    """
+    if not Path(db_path).exists():
+        return 1
+    conn = sqlite3.connect(db_path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'risk_events'").fetchone():
+            return 1
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM risk_events").fetchone()[0]
+        # AUTOINCREMENT never reuses ids of deleted rows
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'risk_events'").fetchone()
+            if row:
+                next_id = max(next_id, row[0] + 1)
+        return next_id
+    finally:
+        conn.close()
+
+
+class JsonlWriter:
+    """Write event chunks as JSON lines, with ids from first_id."""
+
+    def __init__(self, path, first_id=1):
+        self._file = open(path, "w", encoding="utf-8")
+        self._next_id = first_id
+
+    def write(self, chunk):
+        lines = []
+        for event in chunk:
+            lines.append(json.dumps({"id": self._next_id, **event}))
+            self._next_id += 1
+        self._file.write("\n".join(lines) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Write event chunks as row groups of one Parquet file (needs pyarrow)."""
+
+    def __init__(self, path, first_id=1):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._writer = None
+        self._next_id = first_id
+
+    def write(self, chunk):
+        columns = {"id": list(range(self._next_id, self._next_id + len(chunk)))}
+        for name in chunk[0]:
+            columns[name] = [event[name] for event in chunk]
+        self._next_id += len(chunk)
+        table = self._pa.table(columns)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema, compression="zstd")
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _tee(chunks, writers):
+    """Pass chunks through while writing each one to the file writers."""
+    for chunk in chunks:
+        for writer in writers:
+            writer.write(chunk)
+        yield chunk
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=30, help="Spread events over the last N days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk_size", type=int, default=100_000)
+    parser.add_argument("--sqlite", help="SQLite database to append to (e.g. insider_risk.db)")
+    parser.add_argument("--jsonl", help="JSONL output path for the pipeline")
+    parser.add_argument("--parquet", help="Parquet output path (requires pyarrow)")
+    args = parser.parse_args()
+
+    if not (args.sqlite or args.jsonl or args.parquet):
+        parser.error("choose at least one of --sqlite, --jsonl, --parquet")
+
+    # Number file rows like the SQLite rows they are appended with
+    first_id = next_sqlite_id(args.sqlite) if args.sqlite else 1
+    writers = []
+    if args.jsonl:
+        writers.append(JsonlWriter(args.jsonl, first_id))
+    if args.parquet:
+        writers.append(ParquetWriter(args.parquet, first_id))
+
+    started = time.perf_counter()
+    chunks = _tee(
+        generate_events(args.events, args.users, args.days, seed=args.seed, chunk_size=args.chunk_size),
+        writers,
+    )
+    try:
+        if args.sqlite:
+            load_sqlite(args.sqlite, chunks)
+        else:
+            for _ in chunks:
+                pass
+    finally:
+        for writer in writers:
+            writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✓ Generated {args.events:,} events in {elapsed:.1f}s ({args.events / elapsed:,.0f} events/s)")
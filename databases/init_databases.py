@@ -73,6 +73,7 @@ CREATE TABLE IF NOT EXISTS analytics_summary (
     date DATE NOT NULL,
     risk_level TEXT NOT NULL,
     event_count INTEGER DEFAULT 0,
+    sum_risk_score REAL DEFAULT 0,
     avg_risk_score REAL,
     max_risk_score REAL,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -86,13 +87,13 @@ cursor2.execute("CREATE INDEX IF NOT EXISTS idx_analytics_risk_level ON analytic
 # Insert sample analytics data
 cursor2.execute("""
 INSERT OR IGNORE INTO analytics_summary 
-(date, risk_level, event_count, avg_risk_score, max_risk_score)
+(date, risk_level, event_count, sum_risk_score, avg_risk_score, max_risk_score)
 VALUES 
-    ('2024-01-15', 'LOW', 1, 30.0, 30.0),
-    ('2024-01-15', 'MEDIUM', 1, 65.0, 65.0),
-    ('2024-01-15', 'HIGH', 1, 70.0, 70.0),
-    ('2024-01-16', 'LOW', 1, 20.0, 20.0),
-    ('2024-01-16', 'HIGH', 1, 85.0, 85.0)
+    ('2024-01-15', 'LOW', 1, 30.0, 30.0, 30.0),
+    ('2024-01-15', 'MEDIUM', 1, 65.0, 65.0, 65.0),
+    ('2024-01-15', 'HIGH', 1, 70.0, 70.0, 70.0),
+    ('2024-01-16', 'LOW', 1, 20.0, 20.0, 20.0),
+    ('2024-01-16', 'HIGH', 1, 85.0, 85.0, 85.0)
 """)
 
 conn2.commit()
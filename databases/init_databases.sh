@@ -54,6 +54,7 @@ CREATE TABLE IF NOT EXISTS analytics_summary (
     date DATE NOT NULL,
     risk_level TEXT NOT NULL,
     event_count INTEGER DEFAULT 0,
+    sum_risk_score REAL DEFAULT 0,
     avg_risk_score REAL,
     max_risk_score REAL,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -64,13 +65,13 @@ CREATE INDEX IF NOT EXISTS idx_analytics_date ON analytics_summary(date);
 CREATE INDEX IF NOT EXISTS idx_analytics_risk_level ON analytics_summary(risk_level);
 
 INSERT OR IGNORE INTO analytics_summary 
-(date, risk_level, event_count, avg_risk_score, max_risk_score)
+(date, risk_level, event_count, sum_risk_score, avg_risk_score, max_risk_score)
 VALUES 
-    ('2024-01-15', 'LOW', 1, 30.0, 30.0),
-    ('2024-01-15', 'MEDIUM', 1, 65.0, 65.0),
-    ('2024-01-15', 'HIGH', 1, 70.0, 70.0),
-    ('2024-01-16', 'LOW', 1, 20.0, 20.0),
-    ('2024-01-16', 'HIGH', 1, 85.0, 85.0);
+    ('2024-01-15', 'LOW', 1, 30.0, 30.0, 30.0),
+    ('2024-01-15', 'MEDIUM', 1, 65.0, 65.0, 65.0),
+    ('2024-01-15', 'HIGH', 1, 70.0, 70.0, 70.0),
+    ('2024-01-16', 'LOW', 1, 20.0, 20.0, 20.0),
+    ('2024-01-16', 'HIGH', 1, 85.0, 85.0, 85.0);
 EOF
 
 echo "Databases initialized successfully!"
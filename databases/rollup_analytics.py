@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Incremental rollup of risk_events (insider_risk.db) into
+analytics_summary (analytics.db).
+Only events with an id above the stored high-water mark are aggregated,
+and their counts, score sums and maxima are merged into the existing
+(date, risk_level) rows with ON CONFLICT upserts.
+"""
+
+import argparse
+import sqlite3
+from pathlib import Path
+
+script_dir = Path(__file__).parent
+
+ROLLUP_NAME = "analytics_summary"
+
+STATE_TABLE = """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name TEXT PRIMARY KEY,
+    last_event_id INTEGER NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# New rows are inserted; existing (date, risk_level) rows are merged.
+# In DO UPDATE, unqualified columns are the stored values and excluded.*
+# the aggregates of the new events.
+UPSERT_SUMMARY = """
+INSERT INTO analytics_summary
+    (date, risk_level, event_count, sum_risk_score, avg_risk_score,
+     max_risk_score, updated_at)
+SELECT
+    DATE(timestamp),
+    risk_level,
+    COUNT(*),
+    COALESCE(SUM(risk_score), 0),
+    COALESCE(SUM(risk_score), 0) / COUNT(*),
+    MAX(risk_score),
+    CURRENT_TIMESTAMP
+FROM events.risk_events
+WHERE id > :low AND id <= :high AND risk_level IS NOT NULL
+GROUP BY DATE(timestamp), risk_level
+ON CONFLICT(date, risk_level) DO UPDATE SET
+    event_count = event_count + excluded.event_count,
+    sum_risk_score = sum_risk_score + excluded.sum_risk_score,
+    avg_risk_score = (sum_risk_score + excluded.sum_risk_score)
+        / (event_count + excluded.event_count),
+    max_risk_score = MAX(
+        COALESCE(max_risk_score, excluded.max_risk_score),
+        COALESCE(excluded.max_risk_score, max_risk_score)
+    ),
+    updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def ensure_schema(conn):
+    """Create the state table and add sum_risk_score to older databases."""
+    conn.execute(STATE_TABLE)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(analytics_summary)")}
+    if "sum_risk_score" not in columns:
+        conn.execute("ALTER TABLE analytics_summary ADD COLUMN sum_risk_score REAL DEFAULT 0")
+        # Recover sums from the stored averages so merges stay exact
+        conn.execute("UPDATE analytics_summary SET sum_risk_score = avg_risk_score * event_count")
+
+
+def rollup(events_db, analytics_db, rebuild=False):
+    """
+    Aggregate events added since the last run into analytics_summary.
+    The first run (no high-water mark) or rebuild=True recomputes the
+    whole table. Returns (events rolled up, new high-water mark).
+    """
+    conn = sqlite3.connect(analytics_db, isolation_level=None)
+    try:
+        ensure_schema(conn)
+        conn.execute("ATTACH DATABASE ? AS events", (Path(events_db).resolve().as_uri() + "?mode=ro",))
+        conn.execute("BEGIN IMMEDIATE")
+
+        row = conn.execute(
+            "SELECT last_event_id FROM rollup_state WHERE name = ?", (ROLLUP_NAME,)
+        ).fetchone()
+        if rebuild or row is None:
+            conn.execute("DELETE FROM analytics_summary")
+            low = 0
+        else:
+            low = row[0]
+
+        # Fix the upper bound first so rows inserted meanwhile wait for the next run
+        high = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events.risk_events").fetchone()[0]
+        new_events = 0
+        if high > low:
+            new_events = conn.execute(
+                "SELECT COUNT(*) FROM events.risk_events WHERE id > ? AND id <= ?", (low, high)
+            ).fetchone()[0]
+            conn.execute(UPSERT_SUMMARY, {"low": low, "high": high})
+
+        conn.execute(
+            """
+            INSERT INTO rollup_state (name, last_event_id, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(name) DO UPDATE SET
+                last_event_id = excluded.last_event_id,
+                updated_at = excluded.updated_at
+            """,
+            (ROLLUP_NAME, max(high, low)),
+        )
+        conn.execute("COMMIT")
+        return new_events, max(high, low)
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events_db", default=str(script_dir / "insider_risk.db"))
+    parser.add_argument("--analytics_db", default=str(script_dir / "analytics.db"))
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Recompute analytics_summary from all events"
+    )
+    args = parser.parse_args()
+
+    count, high_water_mark = rollup(args.events_db, args.analytics_db, args.rebuild)
+    print(f"✓ Rolled up {count} events into {args.analytics_db} (last event id {high_water_mark})")